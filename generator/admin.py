@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import QRCode
+from .models import QRCode, QRJob
 
 @admin.register(QRCode)
 class QRCodeAdmin(admin.ModelAdmin):
@@ -30,4 +30,13 @@ class QRCodeAdmin(admin.ModelAdmin):
     get_content_preview.short_description = 'Content'
     
     def has_add_permission(self, request):
-        return False  # Disable adding via admin (only via API)
\ No newline at end of file
+        return False  # Disable adding via admin (only via API)
+
+@admin.register(QRJob)
+class QRJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'content_type', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'content_type')
+    readonly_fields = [field.name for field in QRJob._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False  # Jobs are queued by the API
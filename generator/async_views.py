@@ -0,0 +1,220 @@
+import asyncio
+import contextvars
+import json
+import math
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .metrics import collect_request_stages, record_stage, timed
+from .throttling import get_throttle_cost, take_tokens
+from .serializers import TextQRSerializer, URLQRSerializer, PDFQRSerializer, ImageQRSerializer
+from .uploads import IMAGE_TYPES, StreamingUploadHandler
+from .utils import (
+    QR_IMAGE_FORMATS, build_qr_instance, build_qr_payload, delete_stored_files, find_reusable_qr_image,
+    get_qr_image_in_format, render_qr_image, store_qr_files,
+)
+
+
+DEFAULT_ASYNC_SETTINGS = {
+    'EXECUTOR': 'thread',  # 'thread' or 'process'
+    'WORKERS': 4,
+    'MAX_PENDING': 32,  # Requests admitted at once before answering 429
+    'RETRY_AFTER': 1,
+}
+
+
+def get_async_setting(name):
+    return {**DEFAULT_ASYNC_SETTINGS, **getattr(settings, 'QR_ASYNC', {})}[name]
+
+
+class BoundedExecutor:
+    """Worker pool that refuses new work once max_pending jobs are admitted"""
+
+    def __init__(self, executor, max_pending):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        if isinstance(self.executor, ProcessPoolExecutor):
+            # Context variables do not reach another process, so the worker
+            # sends its timed() stages back with the result
+            result, stages = await loop.run_in_executor(self.executor, call_collecting_stages, func, *args)
+            for stage, seconds in stages.items():
+                record_stage(stage, seconds)
+            return result
+        # Run in a copy of this context so timed() stages reach the request's collector
+        return await loop.run_in_executor(self.executor, contextvars.copy_context().run, func, *args)
+
+
+def call_collecting_stages(func, *args):
+    """Call func in a pool process. Returns: (result, stage durations)"""
+    with collect_request_stages() as stages:
+        result = func(*args)
+    return result, stages
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_render_executor():
+    """Process-wide BoundedExecutor configured by settings.QR_ASYNC"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                pool_class = ProcessPoolExecutor if get_async_setting('EXECUTOR') == 'process' else ThreadPoolExecutor
+                _executor = BoundedExecutor(
+                    pool_class(max_workers=get_async_setting('WORKERS')),
+                    get_async_setting('MAX_PENDING'),
+                )
+    return _executor
+
+
+def retry_later_response(error, retry_after):
+    """429 with Retry-After rounded up to whole seconds"""
+    response = JsonResponse({
+        'success': False,
+        'error': error
+    }, status=429)
+    response['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+async def read_request_data(request, allowed_upload_types=None):
+    """Parse a JSON, form or multipart body off the event loop"""
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+
+    def parse():
+        if allowed_upload_types is not None:
+            request.upload_handlers = [StreamingUploadHandler(request, allowed_upload_types)]
+        data = request.POST.dict()
+        data.update(request.FILES.dict())
+        return data
+
+    return await sync_to_async(parse, thread_sensitive=False)()
+
+
+async def generate_qr_async(request, executor, content_type, original_content, file_obj,
+                            size, fill_color, back_color, error_correction='L', border=4,
+                            image_format='png'):
+    """Async counterpart of save_qr_to_model: render in the pool, persist with async ORM"""
+    qr_instance = build_qr_instance(
+        content_type, original_content, file_obj, size, fill_color, back_color, request,
+        error_correction, border, image_format,
+    )
+    existing_image = await sync_to_async(find_reusable_qr_image)(qr_instance.render_hash)
+    image_bytes = None
+    if not existing_image:
+        image_bytes = await executor.run(
+            render_qr_image, qr_instance.qr_data, size, fill_color, back_color,
+            error_correction, border, image_format,
+        )
+
+    with timed('storage'):
+        written_files = await sync_to_async(store_qr_files)(
+            qr_instance, file_obj, existing_image, image_bytes
+        )
+    try:
+        await qr_instance.asave(force_insert=True)
+    except Exception:
+        await sync_to_async(delete_stored_files, thread_sensitive=False)(written_files)
+        raise
+    return qr_instance
+
+
+async def create_async_response(request, executor, qr_instance):
+    """Same negotiation as BaseQRView: raw PNG/WebP/SVG when preferred, else JSON"""
+    # text/html stands in for the browsable API, which answers JSON data here
+    preferred = request.get_preferred_type(['application/json', 'text/html', *QR_IMAGE_FORMATS.values()])
+    image_format = next(
+        (name for name, media_type in QR_IMAGE_FORMATS.items() if media_type == preferred), None
+    )
+    if image_format is None:
+        embed = request.GET.get('embed', 'true').lower() not in ('false', '0', 'no')
+        payload = await sync_to_async(build_qr_payload, thread_sensitive=False)(qr_instance, embed)
+        return JsonResponse(payload)
+
+    image = await executor.run(get_qr_image_in_format, qr_instance, image_format)
+    response = HttpResponse(image, content_type=QR_IMAGE_FORMATS[image_format])
+    response['X-QR-ID'] = str(qr_instance.id)
+    return response
+
+
+def async_qr_view(serializer_class, content_type, allowed_upload_types=None):
+    """Build an async generation view for one content type"""
+
+    @csrf_exempt
+    @require_POST
+    async def view(request):
+        # GenerationThrottle's buckets, checked by hand outside DRF
+        retry_after = await sync_to_async(take_tokens)(request, content_type, get_throttle_cost(content_type))
+        if retry_after is not None:
+            return retry_later_response('Request was throttled, retry later', retry_after)
+
+        executor = get_render_executor()
+        if not executor.try_acquire():
+            return retry_later_response('Server is busy, retry shortly', get_async_setting('RETRY_AFTER'))
+        try:
+            try:
+                data = await read_request_data(request, allowed_upload_types)
+            except ValueError:
+                return JsonResponse({
+                    'success': False,
+                    'errors': {'non_field_errors': ['Malformed request body']}
+                }, status=400)
+
+            serializer = serializer_class(data=data)
+            if not serializer.is_valid():
+                return JsonResponse({
+                    'success': False,
+                    'errors': serializer.errors
+                }, status=400)
+
+            values = serializer.validated_data
+            qr_instance = await generate_qr_async(
+                request,
+                executor,
+                content_type=content_type,
+                original_content=values.get(content_type, '') if content_type in ['text', 'url'] else '',
+                file_obj=values.get('file'),
+                size=values.get('size', 10),
+                fill_color=values.get('fill_color', '#000000'),
+                back_color=values.get('back_color', '#FFFFFF'),
+                error_correction=values.get('error_correction', 'L'),
+                border=values.get('border', 4),
+                image_format=values.get('format', 'png'),
+            )
+            return await create_async_response(request, executor, qr_instance)
+        finally:
+            executor.release()
+
+    view.__name__ = f"async_{content_type}_qr_view"
+    return view
+
+
+text_qr_async_view = async_qr_view(TextQRSerializer, 'text')
+url_qr_async_view = async_qr_view(URLQRSerializer, 'url')
+pdf_qr_async_view = async_qr_view(PDFQRSerializer, 'pdf', {'pdf'})
+image_qr_async_view = async_qr_view(ImageQRSerializer, 'image', IMAGE_TYPES)
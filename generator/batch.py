@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .models import QRCode
+from .serializers import TextQRSerializer, URLQRSerializer
+from .utils import delete_stored_files, generate_qr_code, get_render_hash, get_client_ip
+from .zipstream import stream_zip
+
+
+BATCH_SERIALIZERS = {
+    'text': (TextQRSerializer, 'text'),
+    'url': (URLQRSerializer, 'url'),
+}
+BATCH_FIELDS = ['content_type', 'content', 'size', 'fill_color', 'back_color', 'error_correction', 'border', 'format']
+
+
+class BatchError(Exception):
+    """Raised when a batch payload cannot be parsed"""
+
+
+def get_batch_setting(name, default):
+    return getattr(settings, 'QR_BATCH', {}).get(name, default)
+
+
+def parse_batch_upload(upload, default_content_type=None):
+    """
+    Read batch items from an uploaded CSV or JSONL file.
+    CSV files need a header row using BATCH_FIELDS column names.
+    """
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    name = upload.name.lower()
+    if name.endswith('.csv'):
+        rows = csv.DictReader(text)
+    elif name.endswith(('.jsonl', '.ndjson')):
+        rows = (json.loads(line) for line in text if line.strip())
+    else:
+        raise BatchError("Batch files must be .csv or .jsonl")
+
+    items = []
+    try:
+        for row in rows:
+            if default_content_type and not row.get('content_type'):
+                row['content_type'] = default_content_type
+            items.append({key: value for key, value in row.items() if value not in (None, '')})
+    except (ValueError, csv.Error) as exc:
+        raise BatchError(f"Could not parse batch file: {exc}")
+    return items
+
+
+def validate_batch_items(items):
+    """
+    Validate every item with the single-code serializer for its content_type.
+    Returns: (validated items, {index: errors})
+    """
+    validated, errors = [], {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[index] = {'non_field_errors': ['Each item must be an object']}
+            continue
+        content_type = item.get('content_type', 'text')
+        if content_type not in BATCH_SERIALIZERS:
+            errors[index] = {'content_type': ['Batch supports only text and url items']}
+            continue
+
+        serializer_class, content_field = BATCH_SERIALIZERS[content_type]
+        data = dict(item)
+        if 'content' in data:
+            data.setdefault(content_field, data.pop('content'))
+        serializer = serializer_class(data=data)
+        if not serializer.is_valid():
+            errors[index] = serializer.errors
+            continue
+
+        values = serializer.validated_data
+        validated.append({
+            'content_type': content_type,
+            'content': values[content_field],
+            'size': values.get('size', 10),
+            'fill_color': values.get('fill_color', '#000000'),
+            'back_color': values.get('back_color', '#FFFFFF'),
+            'error_correction': values.get('error_correction', 'L'),
+            'border': values.get('border', 4),
+            'format': values.get('format', 'png'),
+        })
+    return validated, errors
+
+
+def render_batch_item(item):
+    """Render one validated item to image bytes (runs in a pool worker)"""
+    return generate_qr_code(
+        item['content'],
+        size=item['size'],
+        fill_color=item['fill_color'],
+        back_color=item['back_color'],
+        error_correction=item['error_correction'],
+        border=item['border'],
+        image_format=item['format'],
+    ).getvalue()
+
+
+def _chunks(items, chunk_size):
+    for start in range(0, len(items), chunk_size):
+        yield start, items[start:start + chunk_size]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_batch_executor():
+    """
+    Process-wide pool for batch rendering, shared by every batch request
+    Returns: None when QR_BATCH WORKERS is 1 and items render inline
+    """
+    global _executor
+    workers = get_batch_setting('WORKERS', os.cpu_count() or 1)
+    if workers <= 1:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def discard_batch_executor(executor):
+    """Drop a broken pool so the next batch starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_rendered_chunks(items, executor, chunk_size):
+    """
+    Yield (offset, items, image bytes) per chunk in input order.
+    Items are rendered inline without an executor. At most two chunks are
+    in flight so results never pile up in memory.
+    """
+    if executor is None:
+        for offset, chunk in _chunks(items, chunk_size):
+            yield offset, chunk, [render_batch_item(item) for item in chunk]
+        return
+
+    pending = None
+    try:
+        for offset, chunk in _chunks(items, chunk_size):
+            futures = [executor.submit(render_batch_item, item) for item in chunk]
+            if pending is not None:
+                yield pending[0], pending[1], [future.result() for future in pending[2]]
+            pending = (offset, chunk, futures)
+        if pending is not None:
+            yield pending[0], pending[1], [future.result() for future in pending[2]]
+            pending = None
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); later batches get a new pool
+        discard_batch_executor(executor)
+        raise
+    finally:
+        # The pool outlives this batch; drop its queued work if we stopped early
+        if pending is not None:
+            for future in pending[2]:
+                future.cancel()
+
+
+def persist_batch_chunk(chunk, images, request=None):
+    """Write the chunk's images to storage and insert its rows with one bulk_create"""
+    ip_address = get_client_ip(request) if request else None
+    user_agent = request.META.get('HTTP_USER_AGENT', '') if request else ''
+    instances = []
+    written_files = []
+    # As in save_qr_to_model, files go first and are removed if the insert fails
+    try:
+        for item, image in zip(chunk, images):
+            qr_instance = QRCode(
+                content_type=item['content_type'],
+                original_content=item['content'],
+                qr_data=item['content'],
+                size=item['size'],
+                fill_color=item['fill_color'],
+                back_color=item['back_color'],
+                error_correction=item['error_correction'],
+                border=item['border'],
+                image_format=item['format'],
+                render_hash=get_render_hash(
+                    item['content'], item['size'], item['fill_color'], item['back_color'],
+                    error_correction=item['error_correction'], border=item['border'],
+                    image_format=item['format'],
+                ),
+                ip_address=ip_address,
+                user_agent=user_agent,
+            )
+            qr_instance.qr_image.save(
+                f"qr_{uuid.uuid4().hex}.{qr_instance.image_format}", ContentFile(image), save=False
+            )
+            written_files.append((qr_instance.qr_image.storage, qr_instance.qr_image.name))
+            instances.append(qr_instance)
+        return QRCode.objects.bulk_create(instances)
+    except Exception:
+        delete_stored_files(written_files)
+        raise
+
+
+def run_batch(items, request=None):
+    """
+    Render and persist validated items chunk by chunk.
+    Yields (index, QRCode instance, image bytes) as each chunk completes.
+    """
+    chunk_size = get_batch_setting('CHUNK_SIZE', 500)
+    for offset, chunk, images in iter_rendered_chunks(items, get_batch_executor(), chunk_size):
+        instances = persist_batch_chunk(chunk, images, request)
+        for position, (qr_instance, image) in enumerate(zip(instances, images)):
+            yield offset + position, qr_instance, image
+
+
+def batch_result_record(index, qr_instance):
+    return {
+        'index': index,
+        'qr_id': str(qr_instance.id),
+        'content': qr_instance.get_content_preview(),
+        'download_url': f"/download/{qr_instance.id}/",
+        'image_url': qr_instance.qr_image.url,
+    }
+
+
+def stream_batch_jsonl(items, request=None):
+    """Yield one JSON line per generated QR code"""
+    for index, qr_instance, _ in run_batch(items, request):
+        yield json.dumps(batch_result_record(index, qr_instance)) + '\n'
+
+
+def stream_batch_zip(items, request=None):
+    """
+    Yield a ZIP of every generated image followed by a manifest.jsonl
+    The manifest is spooled to a temporary file as images are written,
+    so it does not grow in memory with the batch.
+    """
+    def entries():
+        with tempfile.TemporaryFile() as manifest:
+            for index, qr_instance, image in run_batch(items, request):
+                manifest.write((json.dumps(batch_result_record(index, qr_instance)) + '\n').encode('utf-8'))
+                yield f"{index:06d}_{qr_instance.id}.{qr_instance.image_format}", image
+            manifest.seek(0)
+            yield 'manifest.jsonl', manifest
+
+    return stream_zip(entries())
@@ -0,0 +1,189 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import register_collector
+
+
+DEFAULT_RENDER_CACHE = {
+    'MAX_BYTES': 32 * 1024 * 1024,  # In-process LRU budget
+    'SHARED_CACHE': None,  # Alias from settings.CACHES, e.g. 'default'
+    'SHARED_TIMEOUT': 60 * 60 * 24,
+    'KEY_PREFIX': 'qr:render:',
+}
+
+DEFAULT_MATRIX_CACHE = {
+    'MAX_BYTES': 8 * 1024 * 1024,
+    'SHARED_CACHE': None,
+    'SHARED_TIMEOUT': 60 * 60 * 24,
+    'KEY_PREFIX': 'qr:matrix:',
+}
+
+
+def _content_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def render_cache_key(data, size, fill_color, back_color, error_correction, border, drawer, image_format):
+    """Build a content address for a rendered QR code"""
+    return _content_key(
+        data, size, fill_color.upper(), back_color.upper(), error_correction, border, drawer, image_format
+    )
+
+
+def matrix_cache_key(data, error_correction):
+    """Build a content address for an encoded module matrix"""
+    return _content_key(data, error_correction)
+
+
+class RenderCache:
+    """
+    Two-tier cache of encoded QR images keyed by render_cache_key().
+    The local tier is an LRU bounded by total bytes; the optional shared
+    tier lives on Django's cache framework so several workers can share renders.
+    sizeof measures an entry, so the same class also holds module matrices.
+    """
+
+    def __init__(self, max_bytes, shared_cache=None, shared_timeout=None, key_prefix='', sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.shared_cache = shared_cache
+        self.shared_timeout = shared_timeout
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return cached bytes for key, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.shared_cache is not None:
+            value = self._get_shared().get(self.key_prefix + key)
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._store_local(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Store encoded bytes in every configured tier"""
+        with self._lock:
+            self._store_local(key, value)
+        if self.shared_cache is not None:
+            self._get_shared().set(self.key_prefix + key, value, self.shared_timeout)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Snapshot of the cache counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _get_shared(self):
+        return caches[self.shared_cache]
+
+    def _store_local(self, key, value):
+        # Caller must hold self._lock
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= self.sizeof(previous)
+        self._entries[key] = value
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= self.sizeof(evicted)
+            self.evictions += 1
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _get_cache(setting_name, defaults, sizeof=len):
+    cache = _caches.get(setting_name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(setting_name)
+            if cache is None:
+                config = {**defaults, **getattr(settings, setting_name, {})}
+                cache = _caches[setting_name] = RenderCache(
+                    max_bytes=config['MAX_BYTES'],
+                    shared_cache=config['SHARED_CACHE'],
+                    shared_timeout=config['SHARED_TIMEOUT'],
+                    key_prefix=config['KEY_PREFIX'],
+                    sizeof=sizeof,
+                )
+    return cache
+
+
+def get_render_cache():
+    """Return the process-wide RenderCache configured by settings.QR_RENDER_CACHE"""
+    return _get_cache('QR_RENDER_CACHE', DEFAULT_RENDER_CACHE)
+
+
+def get_matrix_cache():
+    """Return the process-wide module matrix cache configured by settings.QR_MATRIX_CACHE"""
+    return _get_cache('QR_MATRIX_CACHE', DEFAULT_MATRIX_CACHE, sizeof=lambda matrix: matrix.nbytes)
+
+
+# Exported on the metrics endpoint as cache="<label>"
+CACHE_METRIC_LABELS = {
+    'QR_RENDER_CACHE': 'render',
+    'QR_MATRIX_CACHE': 'matrix',
+}
+CACHE_METRICS = [
+    ('hits', 'counter', 'qr_cache_hits_total', 'Local cache hits.'),
+    ('shared_hits', 'counter', 'qr_cache_shared_hits_total', 'Hits served by the shared cache tier.'),
+    ('misses', 'counter', 'qr_cache_misses_total', 'Cache misses.'),
+    ('evictions', 'counter', 'qr_cache_evictions_total', 'Entries evicted from the local tier.'),
+    ('bytes', 'gauge', 'qr_cache_bytes', 'Bytes held in the local tier.'),
+]
+
+
+@register_collector
+def cache_metrics():
+    snapshots = {
+        CACHE_METRIC_LABELS.get(setting_name, setting_name): cache.stats()
+        for setting_name, cache in list(_caches.items())
+    }
+    lines = []
+    for key, metric_type, name, documentation in CACHE_METRICS:
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+        for label, stats in sorted(snapshots.items()):
+            lines.append(f'{name}{{cache="{label}"}} {stats[key]}')
+    return lines
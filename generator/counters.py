@@ -0,0 +1,133 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, DateTimeField, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import QRCode
+
+
+DEFAULT_DOWNLOAD_COUNTS = {
+    'BUFFERED': False,  # Accumulate in the cache and flush in batches
+    'CACHE': 'default',  # Must be shared between workers (Redis, Memcached)
+    'KEY_PREFIX': 'qr:downloads:',
+    'KEY_TIMEOUT': 7 * 24 * 60 * 60,
+    'FLUSH_BATCH_SIZE': 500,
+}
+
+
+def get_download_counts_config():
+    return {**DEFAULT_DOWNLOAD_COUNTS, **getattr(settings, 'QR_DOWNLOAD_COUNTS', {})}
+
+
+def record_download(qr_instance):
+    """Count one download, buffered in the cache or as an atomic UPDATE"""
+    if get_download_counts_config()['BUFFERED']:
+        buffer_download(qr_instance.pk)
+    else:
+        qr_instance.increment_download()
+
+
+def record_downloads(qr_ids):
+    """Count one download for each of qr_ids, buffered or as a single bulk UPDATE"""
+    if get_download_counts_config()['BUFFERED']:
+        for qr_id in qr_ids:
+            buffer_download(qr_id)
+    else:
+        QRCode.objects.filter(pk__in=qr_ids).update(
+            download_count=F('download_count') + 1,
+            last_downloaded=timezone.now(),
+        )
+
+
+# Buffered counts are grouped into epochs. Downloads write to the current
+# epoch; a flush advances the epoch and only drains epochs at least two
+# behind, so writers that read the old epoch number never race the flush.
+
+def _epoch_keys(prefix, epoch):
+    return {
+        'size': f"{prefix}{epoch}:n",
+        'id': lambda index: f"{prefix}{epoch}:ids:{index}",
+        'count': lambda qr_id: f"{prefix}{epoch}:count:{qr_id}",
+        'last': lambda qr_id: f"{prefix}{epoch}:last:{qr_id}",
+    }
+
+
+def buffer_download(qr_id):
+    """Add one download for qr_id to the cache buffer"""
+    config = get_download_counts_config()
+    cache = caches[config['CACHE']]
+    prefix, timeout = config['KEY_PREFIX'], config['KEY_TIMEOUT']
+
+    epoch = cache.get(prefix + 'epoch', 0)
+    keys = _epoch_keys(prefix, epoch)
+    count_key = keys['count'](qr_id)
+
+    if cache.add(count_key, 1, timeout):
+        # First download of this code in the epoch: register it for flushing
+        cache.add(keys['size'], 0, timeout)
+        index = cache.incr(keys['size'])
+        cache.set(keys['id'](index), str(qr_id), timeout)
+    else:
+        try:
+            cache.incr(count_key)
+        except ValueError:
+            cache.add(count_key, 1, timeout)
+    cache.set(keys['last'](qr_id), time.time(), timeout)
+
+
+def flush_download_counts():
+    """
+    Move buffered download counts into the database.
+    Each batch of codes is written with one UPDATE using CASE expressions.
+    Returns: number of downloads flushed
+    """
+    config = get_download_counts_config()
+    cache = caches[config['CACHE']]
+    prefix, batch_size = config['KEY_PREFIX'], config['FLUSH_BATCH_SIZE']
+
+    cache.add(prefix + 'epoch', 0, None)
+    current = cache.incr(prefix + 'epoch')
+    flushed = cache.get(prefix + 'flushed', -1)
+
+    total = 0
+    for epoch in range(flushed + 1, current - 1):
+        keys = _epoch_keys(prefix, epoch)
+        size = cache.get(keys['size'], 0)
+        for start in range(1, size + 1, batch_size):
+            id_keys = [keys['id'](index) for index in range(start, min(start + batch_size, size + 1))]
+            qr_ids = list(cache.get_many(id_keys).values())
+            counts = cache.get_many([keys['count'](qr_id) for qr_id in qr_ids])
+            lasts = cache.get_many([keys['last'](qr_id) for qr_id in qr_ids])
+            total += _apply_counts(qr_ids, counts, lasts, keys)
+            cache.delete_many(id_keys + list(counts) + list(lasts))
+        cache.delete(keys['size'])
+        cache.set(prefix + 'flushed', epoch, None)
+    return total
+
+
+def _apply_counts(qr_ids, counts, lasts, keys):
+    flushed_ids, increments, last_seen = [], [], []
+    total = 0
+    for qr_id in qr_ids:
+        count = counts.get(keys['count'](qr_id))
+        if not count:
+            continue
+        total += count
+        flushed_ids.append(qr_id)
+        increments.append(When(pk=qr_id, then=Value(count)))
+        timestamp = lasts.get(keys['last'](qr_id))
+        if timestamp:
+            last_seen.append(When(
+                pk=qr_id,
+                then=Value(datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)),
+            ))
+
+    if flushed_ids:
+        QRCode.objects.filter(pk__in=flushed_ids).update(
+            download_count=F('download_count') + Case(*increments, default=Value(0), output_field=IntegerField()),
+            last_downloaded=Case(*last_seen, default=F('last_downloaded'), output_field=DateTimeField()),
+        )
+    return total
@@ -0,0 +1,238 @@
+from bisect import bisect_left
+
+import numpy as np
+import qrcode
+from django.conf import settings
+from qrcode import constants, exceptions, util
+
+from .cache import get_matrix_cache, matrix_cache_key
+from .metrics import timed
+
+
+ERROR_CORRECTION_LEVELS = {
+    'L': constants.ERROR_CORRECT_L,
+    'M': constants.ERROR_CORRECT_M,
+    'Q': constants.ERROR_CORRECT_Q,
+    'H': constants.ERROR_CORRECT_H,
+}
+
+
+class QRMatrix:
+    """Encoded module matrix plus the version and mask chosen for it"""
+    __slots__ = ('modules', 'version', 'mask_pattern', 'error_correction')
+
+    def __init__(self, modules, version, mask_pattern, error_correction):
+        modules.flags.writeable = False
+        self.modules = modules
+        self.version = version
+        self.mask_pattern = mask_pattern
+        self.error_correction = error_correction
+
+    @property
+    def nbytes(self):
+        return self.modules.nbytes
+
+
+class _MaskRecordingQRCode(qrcode.QRCode):
+    """qrcode.QRCode that remembers which mask pattern make() picked"""
+    chosen_mask = None
+
+    def best_mask_pattern(self):
+        self.chosen_mask = super().best_mask_pattern()
+        return self.chosen_mask
+
+
+class _DataMappingQRCode(qrcode.QRCode):
+    """qrcode.QRCode that records which modules map_data() fills"""
+    data_positions = None
+
+    def map_data(self, data, mask_pattern):
+        self.data_positions = np.array(
+            [[module is None for module in row] for row in self.modules], dtype=bool
+        )
+        super().map_data(data, mask_pattern)
+
+
+# Versions sharing the same character count indicator widths
+VERSION_GROUPS = ((1, 9), (10, 26), (27, 40))
+
+
+def select_version(data_list, error_correction):
+    """
+    Smallest version whose capacity holds data_list
+    Payload bits are counted once; each version group only changes the
+    length field width, so one bisect per group over the capacity table
+    replaces qrcode's trial fitting.
+    """
+    payload_bits = []
+    for data in data_list:
+        buffer = util.BitBuffer()
+        data.write(buffer)
+        payload_bits.append((data.mode, len(data), len(buffer)))
+
+    capacity = util.BIT_LIMIT_TABLE[error_correction]
+    for first, last in VERSION_GROUPS:
+        mode_sizes = util.mode_sizes_for_version(first)
+        if any(length >= 1 << mode_sizes[mode] for mode, length, _ in payload_bits):
+            continue
+        needed = sum(4 + mode_sizes[mode] + bits for mode, _, bits in payload_bits)
+        version = bisect_left(capacity, needed, first, last + 1)
+        if version <= last:
+            return version
+    raise exceptions.DataOverflowError()
+
+
+def fits_capacity(data, error_correction='L'):
+    """Whether data fits in a QR code at the given error correction level"""
+    level = ERROR_CORRECTION_LEVELS[error_correction]
+    qr = qrcode.QRCode(error_correction=level)
+    qr.add_data(data)
+    try:
+        select_version(qr.data_list, level)
+    except exceptions.DataOverflowError:
+        return False
+    return True
+
+
+def mask_grids(modules_count):
+    """Boolean grid of each of the eight mask patterns, indexed [pattern, row, col]"""
+    i, j = np.indices((modules_count, modules_count))
+    return np.stack([
+        (i + j) % 2 == 0,
+        i % 2 == 0,
+        j % 3 == 0,
+        (i + j) % 3 == 0,
+        (i // 2 + j // 3) % 2 == 0,
+        (i * j) % 2 + (i * j) % 3 == 0,
+        ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+        ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+    ])
+
+
+# 1:1:3:1:1 finder-like runs with four light modules on either side
+_FINDER_PATTERNS = np.array([
+    [1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0],
+    [0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
+], dtype=bool)
+
+
+def _run_penalty(candidates):
+    # Runs of five or more same-colored modules along rows: 3 + (length - 5)
+    count, rows, cols = candidates.shape
+    edges = np.ones((count, rows, cols + 1), dtype=bool)
+    edges[:, :, 1:-1] = candidates[:, :, 1:] != candidates[:, :, :-1]
+    positions = np.flatnonzero(edges)
+    lengths = np.diff(positions)
+    points = np.where(lengths >= 5, lengths - 2, 0)
+    return np.bincount(positions[:-1] // (rows * (cols + 1)), weights=points, minlength=count)
+
+
+def _finder_penalty(candidates):
+    # Every 11-module window along rows matching either finder-like pattern
+    windows = np.lib.stride_tricks.sliding_window_view(candidates, 11, axis=2)
+    matches = (windows[..., None, :] == _FINDER_PATTERNS).all(axis=-1).any(axis=-1)
+    return matches.sum(axis=(1, 2)) * 40
+
+
+def mask_penalties(candidates):
+    """
+    Penalty score of each candidate matrix, shape (count, n, n)
+    Vectorized form of qrcode.util.lost_point, so ties and scores match
+    the pure-Python version exactly.
+    """
+    transposed = candidates.transpose(0, 2, 1)
+    penalties = _run_penalty(candidates) + _run_penalty(transposed)
+
+    blocks = (
+        (candidates[:, :-1, :-1] == candidates[:, 1:, :-1])
+        & (candidates[:, :-1, :-1] == candidates[:, :-1, 1:])
+        & (candidates[:, :-1, :-1] == candidates[:, 1:, 1:])
+    )
+    penalties += blocks.sum(axis=(1, 2)) * 3
+
+    penalties += _finder_penalty(candidates) + _finder_penalty(transposed)
+
+    modules_count = candidates.shape[1]
+    for index, dark_count in enumerate(candidates.sum(axis=(1, 2)).tolist()):
+        percent = float(dark_count) / (modules_count ** 2)
+        penalties[index] += int(abs(percent * 100 - 50) / 5) * 10
+    return penalties
+
+
+def _encode_qrcode(data, error_correction):
+    # Reference path: qrcode's own fitting and eight pure-Python mask trials
+    qr = _MaskRecordingQRCode(
+        version=1,
+        error_correction=ERROR_CORRECTION_LEVELS[error_correction],
+        border=0,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return QRMatrix(
+        np.array(qr.modules, dtype=bool), qr.version, qr.chosen_mask, error_correction
+    )
+
+
+def _encode_numpy(data, error_correction):
+    # Version from the capacity tables; data is mapped once and the eight
+    # masks are applied and scored as arrays
+    level = ERROR_CORRECTION_LEVELS[error_correction]
+    qr = _DataMappingQRCode(error_correction=level, border=0)
+    qr.add_data(data)
+    qr.version = select_version(qr.data_list, level)
+
+    qr.makeImpl(True, 0)
+    masked = np.array(qr.modules, dtype=bool)
+    masks = mask_grids(qr.modules_count)
+    unmasked = masked ^ (masks[0] & qr.data_positions)
+    candidates = unmasked ^ (masks & qr.data_positions)
+    mask_pattern = int(np.argmin(mask_penalties(candidates)))
+
+    # Function patterns are already in place; only the format and version
+    # information depend on the chosen mask
+    qr.modules = candidates[mask_pattern].tolist()
+    qr.setup_type_info(False, mask_pattern)
+    if qr.version >= 7:
+        qr.setup_type_number(False)
+    return QRMatrix(np.array(qr.modules, dtype=bool), qr.version, mask_pattern, error_correction)
+
+
+# Available encoders, selectable by settings.QR_ENCODER; both produce the same matrix
+QR_ENCODERS = {
+    'numpy': _encode_numpy,
+    'qrcode': _encode_qrcode,
+}
+
+
+def encode_qr(data, error_correction='L', encoder=None):
+    """
+    Encode data into a module matrix
+    Matrices depend only on (data, error correction), so they are cached
+    apart from styling and every size/color variant reuses one encode.
+    """
+    key = matrix_cache_key(data, error_correction)
+    cache = get_matrix_cache()
+    matrix = cache.get(key)
+    if matrix is not None:
+        return matrix
+
+    encoder = encoder or getattr(settings, 'QR_ENCODER', 'numpy')
+    with timed('encode'):
+        matrix = QR_ENCODERS[encoder](data, error_correction)
+    cache.set(key, matrix)
+    return matrix
+
+
+def qr_from_matrix(matrix, box_size, border):
+    """qrcode.QRCode ready for make_image() without encoding again"""
+    qr = qrcode.QRCode(
+        version=matrix.version,
+        error_correction=ERROR_CORRECTION_LEVELS[matrix.error_correction],
+        box_size=box_size,
+        border=border,
+        mask_pattern=matrix.mask_pattern,
+    )
+    qr.modules = matrix.modules.tolist()
+    qr.modules_count = len(qr.modules)
+    qr.data_cache = []  # Anything but None stops make_image() from calling make()
+    return qr
@@ -0,0 +1,98 @@
+import csv
+import json
+
+from django.utils import timezone
+
+from .models import QRCode
+from .zipstream import IterableReader, stream_zip
+
+
+# Every stored column, in export order
+EXPORT_FIELDS = [
+    'id', 'content_type', 'original_content', 'qr_data', 'file', 'file_size_bytes', 'file_sha256',
+    'qr_image', 'render_hash', 'size', 'fill_color', 'back_color', 'error_correction', 'border',
+    'image_format', 'created_at', 'ip_address', 'user_agent', 'download_count', 'last_downloaded',
+]
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'zip': 'application/zip',
+}
+
+
+def export_queryset(content_type=None, created_after=None, created_before=None):
+    """
+    Rows to export as dicts of EXPORT_FIELDS, oldest first
+    created_before defaults to now, so repeated passes see the same rows.
+    """
+    queryset = QRCode.objects.filter(created_at__lt=created_before or timezone.now())
+    if content_type:
+        queryset = queryset.filter(content_type=content_type)
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+    return queryset.order_by('created_at', 'id').values(*EXPORT_FIELDS)
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Rows with JSON friendly values, fetched chunk_size at a time (server-side cursor where supported)"""
+    for row in queryset.iterator(chunk_size=chunk_size):
+        row['id'] = str(row['id'])
+        for field in ('created_at', 'last_downloaded'):
+            if row[field]:
+                row[field] = row[field].isoformat()
+        yield row
+
+
+def stream_jsonl(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one JSON line per row"""
+    for row in export_rows(queryset, chunk_size):
+        yield (json.dumps(row) + '\n').encode('utf-8')
+
+
+class _LineBuffer:
+    """csv.writer target that hands back each written line"""
+
+    def write(self, line):
+        return line
+
+
+def stream_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield a header line, then one CSV line per row"""
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_FIELDS).encode('utf-8')
+    for row in export_rows(queryset, chunk_size):
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS]).encode('utf-8')
+
+
+def stream_export_zip(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield a ZIP of images/<id>.<format> for every row, then qr_codes.jsonl
+    Makes two passes over queryset so neither images nor metadata are held
+    in memory; rows whose image is missing from storage are only listed.
+    """
+    storage = QRCode._meta.get_field('qr_image').storage
+
+    def entries():
+        for row in export_rows(queryset, chunk_size):
+            if not row['qr_image']:
+                continue
+            try:
+                image = storage.open(row['qr_image'], 'rb')
+            except FileNotFoundError:
+                continue
+            try:
+                yield f"images/{row['id']}.{row['image_format']}", image
+            finally:
+                image.close()
+        yield 'qr_codes.jsonl', IterableReader(stream_jsonl(queryset, chunk_size))
+
+    return stream_zip(entries())
+
+
+EXPORT_STREAMS = {
+    'jsonl': stream_jsonl,
+    'csv': stream_csv,
+    'zip': stream_export_zip,
+}
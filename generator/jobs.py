@@ -0,0 +1,255 @@
+import logging
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import QRJob
+from .utils import build_qr_payload, delete_stored_files, get_client_ip, save_qr_to_model
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_SETTINGS = {
+    'MAX_ATTEMPTS': 3,
+    'VISIBILITY_TIMEOUT': 300,  # Seconds before a running job is handed to another worker
+    'RETRY_DELAY': 5,  # Seconds; doubled after every failed attempt
+    'POLL_INTERVAL': 1.0,
+    'WORKERS': 2,  # Processes started by run_qr_worker
+    'MAX_QUEUED': 10000,  # Beyond this, enqueueing answers 503
+}
+
+# Rows locked per claim attempt; workers that lose the race move to the next
+CLAIM_CANDIDATES = 10
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are queued to accept another"""
+    pass
+
+
+def get_job_setting(name):
+    return {**DEFAULT_JOB_SETTINGS, **getattr(settings, 'QR_JOBS', {})}[name]
+
+
+def enqueue_job(content_type, original_content, file_obj, size, fill_color, back_color, request,
+                error_correction='L', border=4, image_format='png'):
+    """
+    Queue a generation with the same arguments as save_qr_to_model
+    Uploads are copied to storage first, since the request's temporary
+    file is gone by the time a worker picks the job up.
+    Returns: the saved QRJob
+    """
+    if QRJob.objects.filter(status=QRJob.STATUS_QUEUED).count() >= get_job_setting('MAX_QUEUED'):
+        raise QueueFull("Too many queued jobs")
+
+    job = QRJob(
+        content_type=content_type,
+        options={
+            'original_content': original_content,
+            'size': size,
+            'fill_color': fill_color,
+            'back_color': back_color,
+            'error_correction': error_correction,
+            'border': border,
+            'image_format': image_format,
+        },
+        max_attempts=get_job_setting('MAX_ATTEMPTS'),
+    )
+    if request:
+        job.ip_address = get_client_ip(request)
+        job.user_agent = request.META.get('HTTP_USER_AGENT', '')
+
+    written_files = []
+    if file_obj:
+        job.upload_name = file_obj.name
+        # Hashed while streaming; saves the worker a second read
+        if getattr(file_obj, 'sha256', None):
+            job.options['file_sha256'] = file_obj.sha256
+        job.upload.save(file_obj.name, file_obj, save=False)
+        written_files.append((job.upload.storage, job.upload.name))
+    try:
+        job.save(force_insert=True)
+    except Exception:
+        delete_stored_files(written_files)
+        raise
+    return job
+
+
+def _claimable(now):
+    # Queued jobs that are due, and running jobs whose worker let the
+    # visibility timeout lapse with attempts to spare
+    return (
+        Q(status=QRJob.STATUS_QUEUED, available_at__lte=now)
+        | Q(status=QRJob.STATUS_RUNNING, locked_until__lt=now, attempts__lt=F('max_attempts'))
+    )
+
+
+def fail_expired_jobs():
+    """Mark running jobs that timed out on their last attempt as failed. Returns: count"""
+    now = timezone.now()
+    expired = dict(
+        QRJob.objects.filter(
+            status=QRJob.STATUS_RUNNING, locked_until__lt=now, attempts__gte=F('max_attempts'),
+        ).values_list('pk', 'upload')
+    )
+    if not expired:
+        return 0
+    count = QRJob.objects.filter(
+        pk__in=list(expired), status=QRJob.STATUS_RUNNING, locked_until__lt=now,
+    ).update(
+        status=QRJob.STATUS_FAILED, error='Visibility timeout expired', finished_at=now,
+        locked_by='', locked_until=None, upload='',
+    )
+    storage = QRJob._meta.get_field('upload').storage
+    delete_stored_files([(storage, name) for name in expired.values() if name])
+    return count
+
+
+def claim_job(worker_id, visibility_timeout=None):
+    """
+    Lease the next due job to worker_id
+    Candidates are read with SELECT ... FOR UPDATE SKIP LOCKED where the
+    database supports it; the conditional UPDATE makes the claim safe on
+    databases that do not (SQLite).
+    Returns: the claimed QRJob, or None if nothing is due
+    """
+    if visibility_timeout is None:
+        visibility_timeout = get_job_setting('VISIBILITY_TIMEOUT')
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = list(
+            QRJob.objects.select_for_update(skip_locked=True)
+            .filter(_claimable(now))
+            .order_by('available_at')
+            .values_list('pk', flat=True)[:CLAIM_CANDIDATES]
+        )
+        for pk in candidates:
+            claimed = QRJob.objects.filter(_claimable(now), pk=pk).update(
+                status=QRJob.STATUS_RUNNING,
+                attempts=F('attempts') + 1,
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+            )
+            if claimed:
+                return QRJob.objects.get(pk=pk)
+    return None
+
+
+def _finish(job, **fields):
+    # Only the worker still holding the lease may record the outcome
+    return QRJob.objects.filter(
+        pk=job.pk, status=QRJob.STATUS_RUNNING, locked_by=job.locked_by,
+    ).update(locked_by='', locked_until=None, **fields)
+
+
+def _delete_upload(job):
+    if job.upload:
+        delete_stored_files([(job.upload.storage, job.upload.name)])
+
+
+def run_job(job):
+    """
+    Complete a claimed job with save_qr_to_model
+    Failures are retried with exponential backoff until max_attempts.
+    Returns: the job's new status
+    """
+    options = job.options
+    request_meta = SimpleNamespace(META={
+        'REMOTE_ADDR': job.ip_address,
+        'HTTP_USER_AGENT': job.user_agent,
+    })
+    file_obj = None
+    try:
+        if job.upload:
+            file_obj = File(job.upload.storage.open(job.upload.name, 'rb'), name=job.upload_name)
+            file_obj.sha256 = options.get('file_sha256')
+        qr_instance = save_qr_to_model(
+            content_type=job.content_type,
+            original_content=options['original_content'],
+            file_obj=file_obj,
+            size=options['size'],
+            fill_color=options['fill_color'],
+            back_color=options['back_color'],
+            request=request_meta,
+            error_correction=options['error_correction'],
+            border=options['border'],
+            image_format=options['image_format'],
+        )
+    except Exception as exc:
+        logger.exception("QR job %s failed on attempt %d", job.pk, job.attempts)
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            delay = get_job_setting('RETRY_DELAY') * 2 ** (job.attempts - 1)
+            _finish(job, status=QRJob.STATUS_QUEUED, error=str(exc),
+                    available_at=now + timedelta(seconds=delay))
+            return QRJob.STATUS_QUEUED
+        if _finish(job, status=QRJob.STATUS_FAILED, error=str(exc), finished_at=now, upload=''):
+            _delete_upload(job)
+        return QRJob.STATUS_FAILED
+    finally:
+        if file_obj:
+            file_obj.close()
+
+    # The QR code keeps its own copy (or a deduplicated one) of the upload
+    if _finish(job, status=QRJob.STATUS_SUCCEEDED, result=qr_instance, error='',
+               finished_at=timezone.now(), upload=''):
+        _delete_upload(job)
+    else:
+        logger.warning("QR job %s lost its lease before finishing; result %s kept", job.pk, qr_instance.pk)
+    return QRJob.STATUS_SUCCEEDED
+
+
+def run_worker(worker_id, stop, once=False, max_jobs=None, poll_interval=None, visibility_timeout=None):
+    """
+    Claim and run jobs until stop.is_set(); stop.wait(seconds) is used to idle
+    once=True returns as soon as the queue is empty.
+    Returns: number of jobs run
+    """
+    if poll_interval is None:
+        poll_interval = get_job_setting('POLL_INTERVAL')
+    processed = 0
+    while not stop.is_set():
+        try:
+            fail_expired_jobs()
+            job = claim_job(worker_id, visibility_timeout)
+        except DatabaseError:
+            # Lock contention or a dropped connection; try again after a pause
+            logger.warning("QR worker %s could not claim a job", worker_id, exc_info=True)
+            close_old_connections()
+            stop.wait(poll_interval)
+            continue
+        if job is None:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        status = run_job(job)
+        logger.info("QR job %s: %s", job.pk, status)
+        processed += 1
+        if max_jobs and processed >= max_jobs:
+            break
+    return processed
+
+
+def build_job_payload(job):
+    """JSON body of the 202 response and the job status endpoint"""
+    payload = {
+        'success': job.status != QRJob.STATUS_FAILED,
+        'job_id': str(job.id),
+        'status': job.status,
+        'attempts': job.attempts,
+        'status_url': reverse('api_qr_job', args=[job.id]),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == QRJob.STATUS_SUCCEEDED and job.result:
+        payload['result'] = build_qr_payload(job.result, embed=False)
+    elif job.error:
+        payload['error'] = job.error
+    return payload
@@ -0,0 +1,316 @@
+import io
+import json
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from importlib.metadata import version
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from PIL import Image
+
+from generator.cache import get_matrix_cache, get_render_cache
+from generator.metrics import stage_timings
+from generator.utils import QR_RENDERERS, generate_qr_code, save_qr_to_model
+
+
+BENCHMARK_SETTINGS = {
+    'STORAGES': {
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    'SECURE_SSL_REDIRECT': False,
+    'ALLOWED_HOSTS': ['*'],
+    'QR_THROTTLE': {'ENABLED': False},
+}
+
+PAYLOAD_LENGTHS = [16, 128, 512, 1024]
+BOX_SIZES = [5, 10, 20]
+
+# Metrics compared against a baseline, and whether higher is better
+COMPARED_METRICS = {
+    'ops_per_sec': True,
+    'p50_ms': False,
+    'peak_kib': False,
+}
+
+
+@contextmanager
+def count_png_encodes():
+    """Count every PNG encode Pillow performs inside the block"""
+    Image.init()
+    counter = {'encodes': 0}
+    original = Image.SAVE['PNG']
+
+    def counting_save(*args, **kwargs):
+        counter['encodes'] += 1
+        return original(*args, **kwargs)
+
+    Image.SAVE['PNG'] = counting_save
+    try:
+        yield counter
+    finally:
+        Image.SAVE['PNG'] = original
+
+
+@contextmanager
+def benchmark_environment():
+    """Throwaway test database and in-memory media storage"""
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+    variant_dir = tempfile.mkdtemp(prefix='qr-benchmark-variants-')
+    try:
+        with override_settings(**BENCHMARK_SETTINGS, QR_VARIANTS={'CACHE_DIR': variant_dir}):
+            yield
+    finally:
+        shutil.rmtree(variant_dir, ignore_errors=True)
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+
+def clear_caches():
+    get_render_cache().clear()
+    get_matrix_cache().clear()
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, iterations, warmup=2):
+    """
+    Time func over iterations calls, then measure its peak allocation once
+    tracemalloc runs separately because it slows every allocation down.
+    Returns: dict of ops_per_sec, p50_ms, p99_ms and peak_kib
+    """
+    for _ in range(warmup):
+        func()
+
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    durations.sort()
+    return {
+        'ops_per_sec': iterations / sum(durations),
+        'p50_ms': percentile(durations, 0.50) * 1000,
+        'p99_ms': percentile(durations, 0.99) * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def unique_payload(length):
+    """Fresh payload of the given length, so caches and image reuse never hit"""
+    return (uuid.uuid4().hex * (length // 32 + 1))[:length]
+
+
+def sample_png():
+    output = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 30, 30)).save(output, format='PNG')
+    return output.getvalue()
+
+
+SAMPLE_PDF = b'%PDF-1.4\n1 0 obj<<>>endobj\ntrailer<<>>\n%%EOF\n'
+
+
+def compare_results(results, baseline, threshold):
+    """
+    Cases whose metrics are worse than baseline by more than threshold
+    Returns: list of human readable regression descriptions
+    """
+    regressions = []
+    for case, metrics in results.items():
+        reference = baseline.get(case)
+        if not reference:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = reference.get(metric), metrics[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append(f"{case} {metric}: {old:.2f} -> {new:.2f} ({change:+.0%})")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the QR generation pipeline and API endpoints against a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Requests for the PNG encode count check (default: 20)')
+        parser.add_argument('--iterations', type=int, default=30,
+                            help='Timed iterations per benchmark case (default: 30)')
+        parser.add_argument('--filter', default='',
+                            help='Only run cases whose name contains this text')
+        parser.add_argument('--save-baseline', metavar='PATH',
+                            help='Write the results to PATH as JSON')
+        parser.add_argument('--compare', metavar='PATH',
+                            help='Fail if results regress against the baseline at PATH')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative regression when comparing (default: 0.2)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['results']
+
+        stage_timings.reset()
+        with benchmark_environment():
+            self.check_encode_count(options['requests'])
+            results = self.run_cases(options['iterations'], options['filter'])
+        self.report_stage_timings()
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump({'environment': self.environment(), 'results': results}, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+
+        if baseline is not None:
+            regressions = compare_results(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS(
+                f"No regressions beyond {options['threshold']:.0%} against {options['compare']}"
+            ))
+
+    def environment(self):
+        """Versions recorded with a baseline, to explain differences when comparing"""
+        return {
+            'python': platform.python_version(),
+            'django': version('django'),
+            'pillow': version('pillow'),
+            'qrcode': version('qrcode'),
+            'numpy': version('numpy'),
+            'machine': platform.machine(),
+        }
+
+    def check_encode_count(self, requests):
+        """Fail unless every generation request encodes its PNG exactly once"""
+        client = Client()
+        clear_caches()
+        with count_png_encodes() as counter:
+            for _ in range(requests):
+                response = client.post(
+                    '/api/qr/text/', {'text': uuid.uuid4().hex}, content_type='application/json'
+                )
+                if response.status_code != 200:
+                    raise CommandError(f"Generation request failed with {response.status_code}")
+
+        per_request = counter['encodes'] / requests
+        self.stdout.write(f"PNG encodes per generation request: {per_request:.2f}")
+        if per_request > 1:
+            raise CommandError(f"Expected 1 PNG encode per request, got {per_request:.2f}")
+
+    def benchmark_cases(self):
+        """(name, callable) pairs; every call does a full uncached render"""
+        cases = []
+        for renderer in QR_RENDERERS:
+            for length in PAYLOAD_LENGTHS:
+                for size in BOX_SIZES:
+                    def generate(renderer=renderer, length=length, size=size):
+                        get_matrix_cache().clear()
+                        generate_qr_code(unique_payload(length), size=size, renderer=renderer, use_cache=False)
+                    cases.append((f"generate/{renderer}/len{length}/size{size}", generate))
+
+        cases.append(('save_qr_to_model/text', lambda: save_qr_to_model(
+            'text', unique_payload(64), None, 10, '#000000', '#FFFFFF', None
+        )))
+
+        client = Client()
+        png = sample_png()
+
+        def post(path, data, **kwargs):
+            def call():
+                payload = data() if callable(data) else data
+                response = client.post(path, payload, **kwargs)
+                if response.status_code != 200:
+                    raise CommandError(f"{path} failed with {response.status_code}")
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return call
+
+        def get(path):
+            def call():
+                response = client.get(path)
+                if response.status_code != 200:
+                    raise CommandError(f"{path} failed with {response.status_code}")
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return call
+
+        cases += [
+            ('endpoint/text', post(
+                '/api/qr/text/', lambda: {'text': unique_payload(64)}, content_type='application/json'
+            )),
+            ('endpoint/url', post(
+                '/api/qr/url/', lambda: {'url': f"https://example.com/{unique_payload(32)}"},
+                content_type='application/json',
+            )),
+            ('endpoint/pdf', post('/api/qr/pdf/', lambda: {
+                'file': SimpleUploadedFile(f"{unique_payload(8)}.pdf", SAMPLE_PDF, 'application/pdf'),
+            })),
+            ('endpoint/image', post('/api/qr/image/', lambda: {
+                'file': SimpleUploadedFile(f"{unique_payload(8)}.png", png, 'image/png'),
+            })),
+            ('endpoint/batch10', post(
+                '/api/qr/batch/',
+                lambda: {'items': [{'content': unique_payload(32)} for _ in range(10)], 'output': 'jsonl'},
+                content_type='application/json',
+            )),
+        ]
+
+        qr_instance = save_qr_to_model('text', 'benchmark download', None, 10, '#000000', '#FFFFFF', None)
+        zip_ids = [
+            str(save_qr_to_model('text', unique_payload(32), None, 10, '#000000', '#FFFFFF', None).id)
+            for _ in range(10)
+        ]
+        cases += [
+            ('endpoint/download', get(f"/api/qr/download/{qr_instance.id}/")),
+            ('endpoint/download_zip10', post(
+                '/api/qr/download/', {'ids': zip_ids}, content_type='application/json'
+            )),
+            ('endpoint/download_variant', get(f"/api/qr/download/{qr_instance.id}/?px=512&format=svg")),
+            ('endpoint/list', get('/api/qr/list')),
+        ]
+        return cases
+
+    def run_cases(self, iterations, name_filter=''):
+        results = {}
+        self.stdout.write(f"{'case':<36} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9}")
+        for name, func in self.benchmark_cases():
+            if name_filter not in name:
+                continue
+            clear_caches()
+            result = results[name] = measure(func, iterations)
+            self.stdout.write(
+                f"{name:<36} {result['ops_per_sec']:9.1f} {result['p50_ms']:9.2f} "
+                f"{result['p99_ms']:9.2f} {result['peak_kib']:9.1f}"
+            )
+        return results
+
+    def report_stage_timings(self):
+        """Mean time per call of each pipeline stage (encode, render, compress)"""
+        for stage, timing in sorted(stage_timings.snapshot().items()):
+            self.stdout.write(
+                f"{stage:>10}: {timing['count']:6d} calls, {timing['mean_seconds'] * 1000:8.3f} ms mean"
+            )
@@ -0,0 +1,55 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from generator.export import EXPORT_CHUNK_SIZE, EXPORT_STREAMS, export_queryset
+from generator.serializers import QRExportSerializer
+
+
+class Command(BaseCommand):
+    help = 'Stream every QR code as JSONL, CSV or a ZIP that includes the images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='output', default='jsonl', choices=list(EXPORT_STREAMS),
+                            help='jsonl, csv or zip with images (default: jsonl)')
+        parser.add_argument('--output-file', '-o', default='-',
+                            help='File to write, or - for stdout (default)')
+        parser.add_argument('--content-type', help='Only export this content type')
+        parser.add_argument('--created-after', help='ISO date or datetime, inclusive')
+        parser.add_argument('--created-before', help='ISO date or datetime, exclusive')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help=f"Rows fetched per round trip (default: {EXPORT_CHUNK_SIZE})")
+
+    def handle(self, *args, **options):
+        # Same validation as the export endpoint
+        filters = {
+            name: options[name]
+            for name in ('content_type', 'created_after', 'created_before', 'output')
+            if options[name]
+        }
+        serializer = QRExportSerializer(data=filters)
+        if not serializer.is_valid():
+            raise CommandError('; '.join(
+                f"{field}: {' '.join(errors)}" for field, errors in serializer.errors.items()
+            ))
+        params = serializer.validated_data
+
+        queryset = export_queryset(
+            params.get('content_type'), params.get('created_after'), params.get('created_before')
+        )
+        chunks = EXPORT_STREAMS[params['output']](queryset, options['chunk_size'])
+
+        if options['output_file'] == '-':
+            output = sys.stdout.buffer
+        else:
+            output = open(options['output_file'], 'wb')
+        written = 0
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        if options['output_file'] != '-':
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output_file']}"))
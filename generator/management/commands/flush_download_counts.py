@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from generator.counters import flush_download_counts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered download counts from the cache to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and flush every N seconds')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            flushed = flush_download_counts()
+            self.stdout.write(f"Flushed {flushed} downloads")
+            if not interval:
+                break
+            time.sleep(interval)
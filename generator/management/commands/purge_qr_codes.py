@@ -0,0 +1,221 @@
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from generator.models import QRCode, QRJob
+
+
+DEFAULT_RETENTION = {
+    'DAYS': 365,
+    'KEEP_DOWNLOADED_DAYS': 30,  # None purges regardless of recent downloads
+    'ORPHAN_GRACE_HOURS': 24,  # Files are written before their row is inserted
+    'REUSE_GRACE_SECONDS': 60,  # A save may still reuse a file found through a just-deleted row
+    'BATCH_SIZE': 1000,
+}
+
+# Media directories owned by QRCode and QRJob file fields
+MEDIA_DIRECTORIES = ['qr_codes', 'uploads', 'jobs']
+
+# (model, field) pairs that reference files in MEDIA_DIRECTORIES
+FILE_REFERENCES = [(QRCode, 'qr_image'), (QRCode, 'file'), (QRJob, 'upload')]
+
+
+def get_retention_setting(name):
+    return {**DEFAULT_RETENTION, **getattr(settings, 'QR_RETENTION', {})}[name]
+
+
+def walk_storage(storage, directory):
+    """Every file name under directory, listed through the storage API"""
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield f"{directory}/{name}"
+    for name in directories:
+        yield from walk_storage(storage, f"{directory}/{name}")
+
+
+def referenced_names(names):
+    """The subset of names still referenced by a row, one indexed lookup per field"""
+    referenced = set()
+    for model, field_name in FILE_REFERENCES:
+        referenced.update(
+            model.objects.filter(**{f"{field_name}__in": names}).values_list(field_name, flat=True)
+        )
+    return referenced
+
+
+class Stats:
+    """Running totals printed as the command goes"""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.monotonic()
+        self.scanned = self.rows = self.files = 0
+
+    def line(self):
+        elapsed = time.monotonic() - self.started
+        return (
+            f"{self.label}: {self.scanned} scanned, {self.rows} rows, {self.files} files "
+            f"in {elapsed:.1f}s ({self.scanned / elapsed if elapsed else 0:.0f}/s)"
+        )
+
+
+class Command(BaseCommand):
+    help = 'Delete QR codes past the retention window and sweep media files no row references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Delete QR codes created more than this many days ago '
+                                 '(default: QR_RETENTION DAYS)')
+        parser.add_argument('--keep-downloaded-days', type=int, default=None,
+                            help='Keep codes downloaded within this many days '
+                                 '(default: QR_RETENTION KEEP_DOWNLOADED_DAYS; 0 keeps none)')
+        parser.add_argument('--orphan-grace-hours', type=int, default=None,
+                            help='Never sweep files younger than this (default: QR_RETENTION ORPHAN_GRACE_HOURS)')
+        parser.add_argument('--reuse-grace-seconds', type=int, default=None,
+                            help='Wait this long after deleting rows before deleting their files '
+                                 '(default: QR_RETENTION REUSE_GRACE_SECONDS)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per DELETE and files per reference lookup (default: 1000)')
+        parser.add_argument('--skip-records', action='store_true',
+                            help='Only sweep orphaned files')
+        parser.add_argument('--skip-orphans', action='store_true',
+                            help='Only purge expired records')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be deleted without deleting anything')
+
+    def handle(self, *args, **options):
+        for name in ('days', 'keep_downloaded_days', 'orphan_grace_hours', 'reuse_grace_seconds', 'batch_size'):
+            if options[name] is None:
+                options[name] = get_retention_setting(name.upper())
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        if not options['skip_records']:
+            self.purge_records(options)
+            self.purge_jobs(options)
+        if not options['skip_orphans']:
+            self.sweep_orphans(options)
+
+    def expired_queryset(self, options):
+        now = timezone.now()
+        queryset = QRCode.objects.filter(created_at__lt=now - timedelta(days=options['days']))
+        if options['keep_downloaded_days']:
+            recent = now - timedelta(days=options['keep_downloaded_days'])
+            queryset = queryset.filter(Q(last_downloaded__isnull=True) | Q(last_downloaded__lt=recent))
+        return queryset
+
+    def purge_records(self, options):
+        """Delete expired rows in batches, then the files no remaining row shares"""
+        stats = Stats('records')
+        queryset = self.expired_queryset(options).order_by('pk').values_list('pk', 'qr_image', 'file')
+        storage = QRCode._meta.get_field('qr_image').storage
+        batch_size = options['batch_size']
+        grace = options['reuse_grace_seconds']
+        # (deleted at, names) of batches whose files are not deleted yet
+        pending = deque()
+        last_pk = None
+
+        def delete_files(names):
+            # Reused renders and deduplicated uploads share one file between
+            # rows; only files no surviving row points at are removed
+            unreferenced = names - referenced_names(list(names))
+            for name in unreferenced:
+                storage.delete(name)
+            stats.files += len(unreferenced)
+
+        while True:
+            # Keyset batches rather than one open cursor: rows are deleted
+            # as we go, and SQLite gives a cursor no isolation from that
+            batch_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            batch = list(batch_queryset[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            stats.scanned += len(batch)
+
+            pks = [pk for pk, _, _ in batch]
+            names = {name for _, qr_image, file in batch for name in (qr_image, file) if name}
+            if options['dry_run']:
+                stats.rows += len(pks)
+                self.stdout.write(stats.line())
+                continue
+
+            QRCode.objects.filter(pk__in=pks).delete()
+            stats.rows += len(pks)
+            pending.append((time.monotonic(), names))
+
+            # A save that found a file through one of these rows just before
+            # the delete inserts its own row within the grace period, so the
+            # references are only checked once it has passed
+            ready = set()
+            while pending and time.monotonic() - pending[0][0] >= grace:
+                ready.update(pending.popleft()[1])
+            if ready:
+                delete_files(ready)
+            self.stdout.write(stats.line())
+
+        if pending:
+            time.sleep(max(0, grace - (time.monotonic() - pending[-1][0])))
+            delete_files(set().union(*(names for _, names in pending)))
+            self.stdout.write(stats.line())
+
+        self.stdout.write(self.style.SUCCESS(
+            ("Would delete " if options['dry_run'] else "Deleted ") + stats.line()
+        ))
+
+    def purge_jobs(self, options):
+        """Finished jobs older than the retention window; their uploads are already gone"""
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        finished = QRJob.objects.filter(
+            status__in=[QRJob.STATUS_SUCCEEDED, QRJob.STATUS_FAILED], created_at__lt=cutoff,
+        )
+        if options['dry_run']:
+            self.stdout.write(f"jobs: {finished.count()} finished jobs would be deleted")
+            return
+        deleted = 0
+        while True:
+            pks = list(finished.values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            deleted += QRJob.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"jobs: deleted {deleted} finished jobs"))
+
+    def sweep_orphans(self, options):
+        """Delete media files that no row references, in batches of listed names"""
+        stats = Stats('orphans')
+        storage = QRCode._meta.get_field('qr_image').storage
+        grace_cutoff = timezone.now() - timedelta(hours=options['orphan_grace_hours'])
+        batch_size = options['batch_size']
+
+        def sweep(names):
+            stats.scanned += len(names)
+            for name in set(names) - referenced_names(names):
+                # Fresh files may belong to a save that has not inserted its row yet
+                if storage.get_modified_time(name) > grace_cutoff:
+                    continue
+                if not options['dry_run']:
+                    storage.delete(name)
+                stats.files += 1
+            self.stdout.write(stats.line())
+
+        for directory in MEDIA_DIRECTORIES:
+            names = []
+            for name in walk_storage(storage, directory):
+                names.append(name)
+                if len(names) >= batch_size:
+                    sweep(names)
+                    names = []
+            if names:
+                sweep(names)
+
+        self.stdout.write(self.style.SUCCESS(
+            ("Would sweep " if options['dry_run'] else "Swept ") + stats.line()
+        ))
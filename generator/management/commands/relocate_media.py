@@ -0,0 +1,101 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Case, CharField, Value, When
+
+from generator.models import QRCode, is_sharded, sharded_path
+
+
+FILE_FIELDS = ['qr_image', 'file']
+
+
+def relocated_name(name):
+    """Sharded name for a file stored under the old flat layout"""
+    directory, filename = os.path.split(name)
+    return sharded_path(directory, filename)
+
+
+def copy_file(storage, name):
+    """
+    Copy one stored file to its sharded name through the storage API
+    Safe to re-run: a target that already exists is kept.
+    Returns: (old name, new name) or (old name, None) if the source is missing
+    """
+    target = relocated_name(name)
+    if storage.exists(target):
+        return name, target
+    try:
+        with storage.open(name, 'rb') as source:
+            saved = storage.save(target, source)
+    except FileNotFoundError:
+        return name, None
+    return name, saved
+
+
+class Command(BaseCommand):
+    help = 'Move QR images and uploads from the flat media layout into sharded directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Parallel copies (default: 8)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Files per batch; each batch is one UPDATE per field (default: 500)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the files that would move')
+        parser.add_argument('--keep-old', action='store_true',
+                            help='Leave the old files in place after rows are updated')
+
+    def handle(self, *args, **options):
+        for field_name in FILE_FIELDS:
+            self.relocate_field(field_name, options)
+
+    def pending_names(self, field_name):
+        """Distinct stored names of field_name that are not sharded yet"""
+        names = (
+            QRCode.objects.exclude(**{field_name: ''}).exclude(**{f"{field_name}__isnull": True})
+            .values_list(field_name, flat=True).distinct().order_by(field_name)
+        )
+        return [name for name in names.iterator(chunk_size=2000) if not is_sharded(name)]
+
+    def relocate_field(self, field_name, options):
+        storage = QRCode._meta.get_field(field_name).storage
+        names = self.pending_names(field_name)
+        if options['dry_run']:
+            self.stdout.write(f"{field_name}: {len(names)} files would be relocated")
+            return
+
+        started = time.monotonic()
+        moved = missing = 0
+        batch_size = options['batch_size']
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for start in range(0, len(names), batch_size):
+                batch = names[start:start + batch_size]
+                results = list(executor.map(lambda name: copy_file(storage, name), batch))
+                renamed = {old: new for old, new in results if new}
+                missing += len(batch) - len(renamed)
+
+                # Shared blobs are referenced by several rows; one CASE
+                # expression repoints all of them at once
+                if renamed:
+                    QRCode.objects.filter(**{f"{field_name}__in": list(renamed)}).update(**{
+                        field_name: Case(
+                            *[When(**{field_name: old}, then=Value(new)) for old, new in renamed.items()],
+                            output_field=CharField(),
+                        )
+                    })
+                    if not options['keep_old']:
+                        list(executor.map(storage.delete, renamed))
+                moved += len(renamed)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{field_name}: {moved}/{len(names)} relocated, {missing} missing, "
+                    f"{moved / elapsed if elapsed else 0:.0f} files/s"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{field_name}: relocated {moved} files in {time.monotonic() - started:.1f}s"
+            + (f" ({missing} missing sources skipped)" if missing else "")
+        ))
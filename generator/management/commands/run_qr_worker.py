@@ -0,0 +1,117 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from generator.jobs import get_job_setting, run_worker
+
+
+class StopFlag:
+    """
+    Stop signal for run_worker that is safe to set from a signal handler
+    Event.set() takes a lock the interrupted loop may already hold, so this
+    only flips an attribute and wait() sleeps in short steps.
+    """
+
+    def __init__(self):
+        self.stopped = False
+
+    def set(self):
+        self.stopped = True
+
+    def is_set(self):
+        return self.stopped
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.stopped and time.monotonic() < deadline:
+            time.sleep(min(0.1, max(0, deadline - time.monotonic())))
+        return self.stopped
+
+
+def handle_stop_signals(stop):
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+
+def worker_process(options):
+    """Run jobs in this process; SIGINT/SIGTERM let the current job finish first"""
+    stop = StopFlag()
+    handle_stop_signals(stop)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        processed = run_worker(
+            worker_id, stop,
+            once=options['once'],
+            max_jobs=options['max_jobs'],
+            poll_interval=options['poll_interval'],
+            visibility_timeout=options['visibility_timeout'],
+        )
+    finally:
+        connections.close_all()
+    return processed
+
+
+class Command(BaseCommand):
+    help = 'Run queued QR generation jobs (?async=true requests) in worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Jobs run at once on this host (default: QR_JOBS WORKERS)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help='Restart a worker process after this many jobs')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds between polls of an empty queue (default: QR_JOBS POLL_INTERVAL)')
+        parser.add_argument('--visibility-timeout', type=int, default=None,
+                            help='Seconds a job stays leased to its worker (default: QR_JOBS VISIBILITY_TIMEOUT)')
+
+    def handle(self, *args, **options):
+        processes = options['processes'] or get_job_setting('WORKERS')
+        if processes == 1:
+            processed = worker_process(options)
+            self.stdout.write(self.style.SUCCESS(f"Ran {processed} jobs"))
+            return
+
+        stop = StopFlag()
+        handle_stop_signals(stop)
+        # fork, so children inherit the configured Django setup; connections
+        # must not be shared across it
+        context = multiprocessing.get_context('fork')
+        connections.close_all()
+        workers = {}
+
+        def start_worker():
+            process = context.Process(target=worker_process, args=(options,), daemon=True)
+            process.start()
+            workers[process.sentinel] = process
+
+        for _ in range(processes):
+            start_worker()
+        self.stdout.write(f"Started {processes} QR workers")
+
+        stopping = False
+        while workers:
+            ready = multiprocessing.connection.wait(list(workers), timeout=1)
+            if stop.is_set() and not stopping:
+                # Pass the stop on; each worker finishes its current job
+                stopping = True
+                for process in workers.values():
+                    process.terminate()
+            for sentinel in ready:
+                process = workers.pop(sentinel)
+                process.join()
+                if process.exitcode:
+                    self.stderr.write(f"Worker {process.pid} exited with code {process.exitcode}")
+                # Workers that reached --max-jobs (or crashed) are replaced
+                # unless we are stopping or draining with --once
+                if not stopping and not options['once']:
+                    start_worker()
+
+        self.stdout.write(self.style.SUCCESS("QR workers stopped"))
@@ -0,0 +1,173 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds in seconds (or counts, for query histograms); +Inf is implied
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram keyed by the value of a single label
+    Process-local, like the caches; each worker exports its own series.
+    """
+
+    def __init__(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def record(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                label_value: {
+                    'count': count,
+                    'total_seconds': total,
+                    'mean_seconds': total / count,
+                    'buckets': list(counts),
+                }
+                for label_value, (counts, count, total) in self._series.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        """Prometheus text exposition lines"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_value, series in sorted(self.snapshot().items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['buckets']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{label}}} {_format_number(series["total_seconds"])}')
+            lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by the value of a single label"""
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_value, value in sorted(self.snapshot().items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {_format_number(value)}')
+        return lines
+
+
+stage_timings = Histogram(
+    'qr_stage_duration_seconds', 'Time spent in each QR generation stage.', 'stage'
+)
+request_durations = Histogram(
+    'qr_request_duration_seconds', 'Request latency by view, excluding streamed bodies.', 'view'
+)
+request_queries = Histogram(
+    'qr_request_db_queries', 'Database queries issued per request by view.', 'view', QUERY_COUNT_BUCKETS
+)
+
+METRICS = [stage_timings, request_durations, request_queries]
+_collectors = []
+
+
+def register_metric(metric):
+    """Export a Histogram or Counter on the metrics endpoint"""
+    METRICS.append(metric)
+    return metric
+
+
+def register_collector(collector):
+    """Export lines produced by collector() on the metrics endpoint"""
+    _collectors.append(collector)
+    return collector
+
+
+def render_prometheus():
+    """All registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+
+# Stage durations of the request being handled, when one is being collected
+_request_stages = contextvars.ContextVar('qr_request_stages', default=None)
+
+
+@contextmanager
+def collect_request_stages():
+    """Accumulate timed() stages inside the block into the yielded dict"""
+    stages = {}
+    token = _request_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(token)
+
+
+@contextmanager
+def timed(stage):
+    """Record how long the block takes under stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_stage(stage, seconds):
+    """Add seconds under stage to the histogram and the request being collected"""
+    stage_timings.record(stage, seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
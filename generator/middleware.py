@@ -0,0 +1,72 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import collect_request_stages, request_durations, request_queries, timed
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts and times every query"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        with timed('db'):
+            return execute(sql, params, many, context)
+
+
+def format_server_timing(stages, query_count, total):
+    """Server-Timing header value, durations in milliseconds"""
+    entries = []
+    for stage, seconds in stages.items():
+        entry = f"{stage};dur={seconds * 1000:.2f}"
+        if stage == 'db':
+            entry += f';desc="{query_count} queries"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    Time each request's pipeline stages and database queries.
+    Stages feed the qr_stage_duration_seconds histograms; the request's own
+    breakdown is sent back in a Server-Timing header to staff users, to
+    everyone when settings.QR_SERVER_TIMING is 'all', or to no one when 'off'.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            stages = stack.enter_context(collect_request_stages())
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        request_durations.record(view, total)
+        request_queries.record(view, queries.count)
+
+        if self.show_server_timing(request):
+            response['Server-Timing'] = format_server_timing(stages, queries.count, total)
+        return response
+
+    def show_server_timing(self, request):
+        mode = getattr(settings, 'QR_SERVER_TIMING', 'staff')
+        if mode == 'all':
+            return True
+        if mode == 'staff':
+            # Set by AuthenticationMiddleware (or DRF) further down the stack
+            user = getattr(request, 'user', None)
+            return bool(user and user.is_staff)
+        return False
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='render_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0002_qrcode_render_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='qrcode',
+            index=models.Index(fields=['download_count'], name='generator_q_downloa_b0e9cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qrcode',
+            index=models.Index(fields=['last_downloaded'], name='generator_q_last_do_a47d06_idx'),
+        ),
+    ]
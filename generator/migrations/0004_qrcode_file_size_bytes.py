@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0003_qrcode_download_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='file_size_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0004_qrcode_file_size_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='file_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
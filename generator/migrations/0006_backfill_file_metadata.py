@@ -0,0 +1,46 @@
+import hashlib
+
+from django.db import migrations
+
+
+BATCH_SIZE = 500
+
+
+def backfill_file_metadata(apps, schema_editor):
+    """Store size and SHA-256 for uploads saved before the columns existed"""
+    QRCode = apps.get_model('generator', 'QRCode')
+    pending = (
+        QRCode.objects.exclude(file='').exclude(file__isnull=True)
+        .filter(file_sha256='')
+        .only('id', 'file')
+    )
+
+    batch = []
+    for qr in pending.iterator(chunk_size=BATCH_SIZE):
+        digest, size = hashlib.sha256(), 0
+        try:
+            with qr.file.open('rb') as f:
+                for chunk in f.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+        except OSError:
+            continue  # Missing file; nothing to record
+        qr.file_sha256 = digest.hexdigest()
+        qr.file_size_bytes = size
+        batch.append(qr)
+        if len(batch) >= BATCH_SIZE:
+            QRCode.objects.bulk_update(batch, ['file_sha256', 'file_size_bytes'])
+            batch = []
+    if batch:
+        QRCode.objects.bulk_update(batch, ['file_sha256', 'file_size_bytes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0005_qrcode_file_sha256'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_file_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0006_backfill_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='border',
+            field=models.PositiveSmallIntegerField(default=4),
+        ),
+        migrations.AddField(
+            model_name='qrcode',
+            name='error_correction',
+            field=models.CharField(choices=[('L', 'Low (7%)'), ('M', 'Medium (15%)'), ('Q', 'Quartile (25%)'), ('H', 'High (30%)')], default='L', max_length=1),
+        ),
+    ]
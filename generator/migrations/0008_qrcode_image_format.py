@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0007_qrcode_error_correction_border'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='image_format',
+            field=models.CharField(choices=[('png', 'PNG'), ('webp', 'WebP'), ('svg', 'SVG')], default='png', max_length=4),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:38
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_qr_data(apps, schema_editor):
+    """Text and URL codes encoded their content; what older file codes encoded is unknown"""
+    QRCode = apps.get_model('generator', 'QRCode')
+    QRCode.objects.filter(content_type__in=['text', 'url']).update(qr_data=F('original_content'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0008_qrcode_image_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='qr_data',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(backfill_qr_data, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:44
+
+import django.db.models.deletion
+import django.utils.timezone
+import generator.models
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0009_qrcode_qr_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QRJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('content_type', models.CharField(choices=[('text', 'Text'), ('url', 'URL'), ('pdf', 'PDF'), ('image', 'Image')], max_length=10)),
+                ('options', models.JSONField(default=dict)),
+                ('upload', models.FileField(blank=True, null=True, upload_to=generator.models.job_upload_path)),
+                ('upload_name', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.TextField(blank=True)),
+                ('result', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='generator.qrcode')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='generator_q_status_03de2f_idx'), models.Index(fields=['status', 'locked_until'], name='generator_q_status_2ecc37_idx')],
+            },
+        ),
+    ]
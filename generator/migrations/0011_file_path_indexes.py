@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:49
+
+import generator.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0010_qrjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='qrcode',
+            name='file',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to=generator.models.upload_file_path),
+        ),
+        migrations.AlterField(
+            model_name='qrcode',
+            name='qr_image',
+            field=models.ImageField(db_index=True, upload_to=generator.models.qr_code_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='qrjob',
+            name='upload',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to=generator.models.job_upload_path),
+        ),
+    ]
@@ -1,22 +1,37 @@
 from django.db import models
+from django.db.models import F
 import os
 import uuid
 from django.utils import timezone
 
 
+def sharded_path(directory, filename):
+    """
+    directory/ab/cd/filename, sharded on the first four characters
+    Names start with a random hex UUID, so files spread evenly over
+    65,536 directories instead of piling up in one.
+    """
+    return os.path.join(directory, filename[:2], filename[2:4], filename)
+
+def is_sharded(name):
+    """Whether a stored name already follows sharded_path()"""
+    parts = name.split('/')
+    filename = parts[-1]
+    return len(parts) >= 4 and parts[-3] == filename[:2] and parts[-2] == filename[2:4]
+
 def qr_code_upload_path(instance, filename):
     """Generate upload path for QR code images"""
     # Generate unique filename
     ext = filename.split('.')[-1]
     filename = f"{uuid.uuid4().hex}.{ext}"
-    return os.path.join('qr_codes', filename)
+    return sharded_path('qr_codes', filename)
 
 def upload_file_path(instance, filename):
     """Generate upload path for source files"""
     # Generate unique filename
     ext = filename.split('.')[-1]
     filename = f"{uuid.uuid4().hex}.{ext}"
-    return os.path.join('uploads', instance.content_type, filename)
+    return sharded_path(os.path.join('uploads', instance.content_type), filename)
 
 class QRCode(models.Model):
     CONTENT_TYPE_CHOICES = [
@@ -26,19 +41,39 @@ class QRCode(models.Model):
         ('image', 'Image'),
     ]
     
+    ERROR_CORRECTION_CHOICES = [
+        ('L', 'Low (7%)'),
+        ('M', 'Medium (15%)'),
+        ('Q', 'Quartile (25%)'),
+        ('H', 'High (30%)'),
+    ]
+    
+    IMAGE_FORMAT_CHOICES = [
+        ('png', 'PNG'),
+        ('webp', 'WebP'),
+        ('svg', 'SVG'),
+    ]
+    
     # Basic information
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     content_type = models.CharField(max_length=10, choices=CONTENT_TYPE_CHOICES)
     original_content = models.TextField(blank=True)  # For text/URL
-    file = models.FileField(upload_to=upload_file_path, null=True, blank=True)  # For PDF/Image
+    qr_data = models.TextField(blank=True)  # Exact data encoded, so variants can be re-rendered
+    file = models.FileField(upload_to=upload_file_path, null=True, blank=True, db_index=True)  # For PDF/Image
+    file_size_bytes = models.PositiveBigIntegerField(null=True, blank=True)  # Stored at upload time
+    file_sha256 = models.CharField(max_length=64, blank=True, db_index=True)  # Upload deduplication
     
     # QR Code image
-    qr_image = models.ImageField(upload_to=qr_code_upload_path)
+    qr_image = models.ImageField(upload_to=qr_code_upload_path, db_index=True)  # Indexed for shared-file lookups
+    render_hash = models.CharField(max_length=64, blank=True, db_index=True)  # Content address of the render
     
     # Customization options
     size = models.PositiveSmallIntegerField(default=10)  # QR box size
     fill_color = models.CharField(max_length=7, default='#000000')  # Hex color
     back_color = models.CharField(max_length=7, default='#FFFFFF')  # Hex color
+    error_correction = models.CharField(max_length=1, choices=ERROR_CORRECTION_CHOICES, default='L')
+    border = models.PositiveSmallIntegerField(default=4)  # Quiet zone in modules
+    image_format = models.CharField(max_length=4, choices=IMAGE_FORMAT_CHOICES, default='png')  # Stored qr_image format
     
     # Metadata
     created_at = models.DateTimeField(default=timezone.now)
@@ -54,6 +89,8 @@ class QRCode(models.Model):
         indexes = [
             models.Index(fields=['created_at']),
             models.Index(fields=['content_type']),
+            models.Index(fields=['download_count']),
+            models.Index(fields=['last_downloaded']),
         ]
     
     def __str__(self):
@@ -70,7 +107,9 @@ class QRCode(models.Model):
     def get_file_size(self):
         """Get file size in human readable format"""
         if self.file:
-            size_bytes = self.file.size
+            size_bytes = self.file_size_bytes
+            if size_bytes is None:
+                size_bytes = self.file.size
             for unit in ['B', 'KB', 'MB', 'GB']:
                 if size_bytes < 1024.0:
                     return f"{size_bytes:.1f} {unit}"
@@ -78,7 +117,63 @@ class QRCode(models.Model):
         return None
     
     def increment_download(self):
-        """Increment download counter"""
+        """Increment download counter atomically in the database"""
+        now = timezone.now()
+        QRCode.objects.filter(pk=self.pk).update(
+            download_count=F('download_count') + 1,
+            last_downloaded=now,
+        )
         self.download_count += 1
-        self.last_downloaded = timezone.now()
-        self.save(update_fields=['download_count', 'last_downloaded'])
\ No newline at end of file
+        self.last_downloaded = now
+
+def job_upload_path(instance, filename):
+    """Staging path for uploads waiting on a queued job"""
+    ext = filename.split('.')[-1]
+    return sharded_path('jobs', f"{instance.id.hex}.{ext}")
+
+class QRJob(models.Model):
+    """Generation request queued for the run_qr_worker command"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    content_type = models.CharField(max_length=10, choices=QRCode.CONTENT_TYPE_CHOICES)
+    options = models.JSONField(default=dict)  # Validated save_qr_to_model arguments
+    upload = models.FileField(upload_to=job_upload_path, null=True, blank=True, db_index=True)  # Staged PDF/Image
+    upload_name = models.CharField(max_length=255, blank=True)  # Client file name, encoded as "File: <name>"
+    
+    # Queue state
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    available_at = models.DateTimeField(default=timezone.now)  # Not claimed before this (retry backoff)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)  # Visibility timeout of a running job
+    
+    # Outcome
+    result = models.ForeignKey(QRCode, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    error = models.TextField(blank=True)
+    
+    # Metadata
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'locked_until']),
+        ]
+    
+    def __str__(self):
+        return f"{self.content_type.upper()} job {self.id} ({self.status})"
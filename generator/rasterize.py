@@ -0,0 +1,120 @@
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+ANTIALIASING_FACTOR = 4  # Same supersampling qrcode uses for its corners
+
+# Neighbour bits used to index module tiles
+NORTH, EAST, SOUTH, WEST = 1, 2, 4, 8
+EMPTY_TILE = 16
+SQUARE_TILE = 17
+FINDER_SIZE = 7
+
+
+@lru_cache(maxsize=32)
+def _rounded_corner(corner_width):
+    """Antialiased coverage (0-255) of a north-west rounded corner"""
+    fake_width = corner_width * ANTIALIASING_FACTOR
+    base = Image.new('L', (fake_width, fake_width), 0)
+    ImageDraw.Draw(base).ellipse((0, 0, fake_width * 2, fake_width * 2), fill=255)
+    corner = base.resize((corner_width, corner_width), Image.Resampling.LANCZOS)
+    return np.asarray(corner, dtype=np.uint8)
+
+
+@lru_cache(maxsize=32)
+def module_tiles(box_size):
+    """
+    Coverage tiles for one module, indexed by neighbour pattern.
+    Indexes 0-15 are dark modules keyed by NORTH/EAST/SOUTH/WEST bits,
+    EMPTY_TILE is a light module and SQUARE_TILE a finder-pattern module.
+    """
+    tiles = np.zeros((SQUARE_TILE + 1, box_size, box_size), dtype=np.uint8)
+    tiles[SQUARE_TILE] = 255
+
+    corner_width = box_size // 2
+    if corner_width == 0:
+        tiles[:EMPTY_TILE] = 255
+        return tiles
+
+    nw = _rounded_corner(corner_width)
+    ne, sw, se = nw[:, ::-1], nw[::-1, :], nw[::-1, ::-1]
+    square = np.full((corner_width, corner_width), 255, dtype=np.uint8)
+    c = corner_width
+
+    for pattern in range(EMPTY_TILE):
+        north, east = pattern & NORTH, pattern & EAST
+        south, west = pattern & SOUTH, pattern & WEST
+        tile = tiles[pattern]
+        tile[:c, :c] = square if (north or west) else nw
+        tile[:c, c:2 * c] = square if (north or east) else ne
+        tile[c:2 * c, c:2 * c] = square if (south or east) else se
+        tile[c:2 * c, :c] = square if (south or west) else sw
+
+    tiles.flags.writeable = False
+    return tiles
+
+
+def tile_index(modules, border):
+    """
+    Tile index (see module_tiles) of every module, quiet zone included.
+    Dark modules are keyed by their neighbour pattern, matching
+    RoundedModuleDrawer without a per-module draw call.
+    """
+    dark = np.asarray(modules, dtype=bool)
+    count = dark.shape[0]
+
+    padded = np.pad(dark, 1).astype(np.uint8)
+    pattern = (
+        padded[:-2, 1:-1] * NORTH
+        | padded[1:-1, 2:] * EAST
+        | padded[2:, 1:-1] * SOUTH
+        | padded[1:-1, :-2] * WEST
+    )
+    index = np.where(dark, pattern, EMPTY_TILE).astype(np.uint8)
+
+    # Finder patterns are drawn square, as qrcode's default eye drawer does
+    near = np.arange(count) < FINDER_SIZE
+    far = np.arange(count) >= count - FINDER_SIZE
+    eyes = (near[:, None] & near[None, :]) | (near[:, None] & far[None, :]) | (far[:, None] & near[None, :])
+    index[eyes & dark] = SQUARE_TILE
+
+    return np.pad(index, border, constant_values=EMPTY_TILE)
+
+
+def render_coverage(index, box_size):
+    """Expand a tile index into a 2D uint8 coverage array (255 = dark)"""
+    rows, cols = index.shape
+    tiles = module_tiles(box_size)
+    return tiles[index].transpose(0, 2, 1, 3).reshape(rows * box_size, cols * box_size)
+
+
+def coverage_levels(index, box_size):
+    """Sorted coverage values a render of index uses, read from its tiles only"""
+    return np.unique(module_tiles(box_size)[np.unique(index)])
+
+
+def palettize(coverage, levels, fill_rgb, back_rgb):
+    """
+    Map a coverage array onto fill/back colors as a palette Pillow image
+    levels are the coverage values present (about box_size + 1 of them), so
+    the palette holds exactly the colors the render uses.
+    """
+    lut = np.zeros(256, dtype=np.uint8)
+    lut[levels] = np.arange(len(levels))
+    fill = np.array(fill_rgb, dtype=np.float32)
+    back = np.array(back_rgb, dtype=np.float32)
+    ramp = levels.astype(np.float32)[:, None] / 255.0
+    palette = np.rint(back + ramp * (fill - back)).astype(np.uint8)
+    image = Image.fromarray(lut[coverage], 'P')
+    image.putpalette(palette.ravel().tolist())
+    return image
+
+
+def render_modules(modules, box_size, border, fill_rgb, back_rgb):
+    """Render a module matrix straight to a palette Pillow image"""
+    index = tile_index(modules, border)
+    return palettize(
+        render_coverage(index, box_size), coverage_levels(index, box_size), fill_rgb, back_rgb
+    )
@@ -0,0 +1,25 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class BinaryImageRenderer(BaseRenderer):
+    """Pass already-encoded image bytes through untouched"""
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class PNGRenderer(BinaryImageRenderer):
+    media_type = 'image/png'
+    format = 'png'
+
+
+class WebPRenderer(BinaryImageRenderer):
+    media_type = 'image/webp'
+    format = 'webp'
+
+
+class SVGRenderer(BinaryImageRenderer):
+    media_type = 'image/svg+xml'
+    format = 'svg'
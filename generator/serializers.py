@@ -1,7 +1,11 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError as DjangoValidationError
+from .encoding import fits_capacity
 from .models import QRCode
+from .uploads import IMAGE_TYPES, get_file_type, get_upload_setting
+from .variants import get_variant_setting
 
 
 class TextQRSerializer(serializers.Serializer):
@@ -9,12 +13,25 @@ class TextQRSerializer(serializers.Serializer):
     size = serializers.IntegerField(min_value=5, max_value=20, default=10)
     fill_color = serializers.CharField(max_length=7, default="#000000")
     back_color = serializers.CharField(max_length=7, default="#FFFFFF")
+    error_correction = serializers.ChoiceField(choices=['L', 'M', 'Q', 'H'], default='L')
+    border = serializers.IntegerField(min_value=0, max_value=10, default=4)
+    format = serializers.ChoiceField(choices=['png', 'webp', 'svg'], default='png')
+    
+    def validate(self, attrs):
+        if not fits_capacity(attrs['text'], attrs['error_correction']):
+            raise serializers.ValidationError(
+                {'text': ["Text is too long for a QR code at this error correction level"]}
+            )
+        return attrs
 
 class URLQRSerializer(serializers.Serializer):
     url = serializers.CharField(max_length=500, required=True)
     size = serializers.IntegerField(min_value=5, max_value=20, default=10)
     fill_color = serializers.CharField(max_length=7, default="#000000")
     back_color = serializers.CharField(max_length=7, default="#FFFFFF")
+    error_correction = serializers.ChoiceField(choices=['L', 'M', 'Q', 'H'], default='L')
+    border = serializers.IntegerField(min_value=0, max_value=10, default=4)
+    format = serializers.ChoiceField(choices=['png', 'webp', 'svg'], default='png')
     
     def validate_url(self, value):
         validator = URLValidator()
@@ -27,35 +44,86 @@ class URLQRSerializer(serializers.Serializer):
         if not value.startswith(('http://', 'https://')):
             value = 'https://' + value
         return value
+    
+    def validate(self, attrs):
+        if not fits_capacity(attrs['url'], attrs['error_correction']):
+            raise serializers.ValidationError(
+                {'url': ["URL is too long for a QR code at this error correction level"]}
+            )
+        return attrs
 
 class FileQRSerializer(serializers.Serializer):
     file = serializers.FileField(required=True)
     size = serializers.IntegerField(min_value=5, max_value=20, default=10)
+    error_correction = serializers.ChoiceField(choices=['L', 'M', 'Q', 'H'], default='L')
+    border = serializers.IntegerField(min_value=0, max_value=10, default=4)
+    format = serializers.ChoiceField(choices=['png', 'webp', 'svg'], default='png')
     
     def validate_file(self, value):
-        # Limit file size to 10MB
-        max_size = 10 * 1024 * 1024
+        # Limit file size (10MB by default, see QR_UPLOAD)
+        max_size = get_upload_setting('MAX_FILE_SIZE')
         if value.size > max_size:
-            raise serializers.ValidationError("File size should not exceed 10MB")
+            raise serializers.ValidationError(
+                f"File size should not exceed {max_size // (1024 * 1024)}MB"
+            )
         return value
 
 class PDFQRSerializer(FileQRSerializer):
     def validate_file(self, value):
         super().validate_file(value)
-        if not value.name.lower().endswith('.pdf'):
+        # Type is checked by magic bytes, not by the client-supplied name
+        if get_file_type(value) != 'pdf':
             raise serializers.ValidationError("Only PDF files are allowed")
         return value
 
 class ImageQRSerializer(FileQRSerializer):
     def validate_file(self, value):
         super().validate_file(value)
-        allowed_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
-        if not any(value.name.lower().endswith(ext) for ext in allowed_extensions):
+        if get_file_type(value) not in IMAGE_TYPES:
             raise serializers.ValidationError(
                 "Only image files (JPG, PNG, GIF, BMP, WEBP) are allowed"
             )
         return value
 
+class BatchQRSerializer(serializers.Serializer):
+    items = serializers.ListField(child=serializers.DictField(), required=False)
+    file = serializers.FileField(required=False)  # CSV or JSONL alternative to items
+    content_type = serializers.ChoiceField(choices=['text', 'url'], required=False)
+    output = serializers.ChoiceField(choices=['zip', 'jsonl'], default='zip')
+    
+    def validate(self, attrs):
+        if not attrs.get('items') and not attrs.get('file'):
+            raise serializers.ValidationError("Provide either items or a batch file")
+        return attrs
+
+class QRCodeListFilterSerializer(serializers.Serializer):
+    content_type = serializers.ChoiceField(choices=QRCode.CONTENT_TYPE_CHOICES, required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+class QRMultiDownloadSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+    
+    def validate_ids(self, value):
+        max_ids = getattr(settings, 'QR_BATCH', {}).get('MAX_DOWNLOAD_IDS', 5000)
+        value = list(dict.fromkeys(value))  # Drop repeats, keep order
+        if len(value) > max_ids:
+            raise serializers.ValidationError(f"At most {max_ids} QR codes can be downloaded at once")
+        return value
+
+class QRExportSerializer(QRCodeListFilterSerializer):
+    output = serializers.ChoiceField(choices=['jsonl', 'csv', 'zip'], default='jsonl')
+
+class QRVariantSerializer(serializers.Serializer):
+    px = serializers.IntegerField(required=False)
+    format = serializers.ChoiceField(choices=['png', 'webp', 'svg'], required=False)
+    
+    def validate_px(self, value):
+        min_px, max_px = get_variant_setting('MIN_PX'), get_variant_setting('MAX_PX')
+        if not min_px <= value <= max_px:
+            raise serializers.ValidationError(f"px must be between {min_px} and {max_px}")
+        return value
+
 # Model Serializer
 class QRCodeSerializer(serializers.ModelSerializer):
     content_preview = serializers.SerializerMethodField()
@@ -72,6 +140,9 @@ class QRCodeSerializer(serializers.ModelSerializer):
             'size',
             'fill_color',
             'back_color',
+            'error_correction',
+            'border',
+            'image_format',
             'created_at',
             'download_count',
             'qr_image_url',
@@ -0,0 +1,52 @@
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import QRCode
+
+
+STATS_CACHE_KEY = 'qr:stats:snapshot'
+
+
+def compute_qr_stats():
+    """Collect QR statistics with one conditional-aggregate query"""
+    start_of_today = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    by_type = {
+        content_type: Count('id', filter=Q(content_type=content_type))
+        for content_type, _ in QRCode.CONTENT_TYPE_CHOICES
+    }
+    totals = QRCode.objects.aggregate(
+        total_qrs=Count('id'),
+        total_downloads=Coalesce(Sum('download_count'), 0),
+        today_count=Count('id', filter=Q(created_at__gte=start_of_today)),
+        **by_type,
+    )
+    return {
+        'total_qrs': totals['total_qrs'],
+        'total_downloads': totals['total_downloads'],
+        'by_type': {content_type: totals[content_type] for content_type in by_type},
+        'today_count': totals['today_count'],
+        'most_downloaded': QRCode.objects.order_by('-download_count').first(),
+        'recent_activity': list(
+            QRCode.objects.filter(last_downloaded__isnull=False).order_by('-last_downloaded')[:10]
+        ),
+    }
+
+
+def get_qr_stats():
+    """
+    Statistics snapshot shared by the stats and home pages
+    Cached for QR_STATS_CACHE_TTL seconds so page views stay constant-time.
+    """
+    ttl = getattr(settings, 'QR_STATS_CACHE_TTL', 30)
+    if not ttl:
+        return compute_qr_stats()
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_qr_stats()
+        cache.set(STATS_CACHE_KEY, stats, ttl)
+    return stats
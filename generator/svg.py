@@ -0,0 +1,35 @@
+from xml.sax.saxutils import quoteattr
+
+
+def render_svg(modules, box_size, border, fill_color="#000000", back_color="#FFFFFF"):
+    """
+    Render a module matrix as a compact SVG document.
+    Horizontal runs of dark modules are merged into one path segment each,
+    drawn in module units and scaled through the viewBox.
+    Returns: SVG as UTF-8 bytes
+    """
+    count = len(modules)
+    dimension = count + 2 * border
+    pixels = dimension * box_size
+
+    segments = []
+    for y, row in enumerate(modules):
+        x = 0
+        while x < count:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < count and row[x]:
+                x += 1
+            segments.append(f"M{start + border},{y + border}h{x - start}v1h-{x - start}z")
+
+    svg = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {dimension} {dimension}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill={quoteattr(back_color)}/>'
+        f'<path fill={quoteattr(fill_color)} d="{"".join(segments)}"/>'
+        '</svg>\n'
+    )
+    return svg.encode('utf-8')
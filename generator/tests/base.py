@@ -0,0 +1,44 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+
+def pdf_upload(name='document.pdf', body=b'hello'):
+    """Minimal file that passes the PDF magic-byte check"""
+    return SimpleUploadedFile(name, b'%PDF-1.4\n' + body * 8, content_type='application/pdf')
+
+
+class MediaTestCase(TestCase):
+    """
+    TestCase whose stored files and variant cache live in temporary directories
+    The default cache (throttle buckets, buffered counts, stats) is cleared
+    for every test, and HTTPS redirects are off for the test client.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = self.temporary_directory()
+        self.enterContext(override_settings(
+            MEDIA_ROOT=self.media_root,
+            QR_VARIANTS={'CACHE_DIR': self.temporary_directory()},
+            SECURE_SSL_REDIRECT=False,
+        ))
+        # Rebuilt on first use with the temporary CACHE_DIR
+        self.enterContext(mock.patch('generator.variants._cache', None))
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def temporary_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        return directory
+
+    def stored_files(self):
+        """Names of every file under MEDIA_ROOT, as stored on the model fields"""
+        root = Path(self.media_root)
+        return sorted(path.relative_to(root).as_posix() for path in root.rglob('*') if path.is_file())
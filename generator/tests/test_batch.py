@@ -0,0 +1,124 @@
+import io
+import json
+import zipfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+
+from generator import batch
+from generator.models import QRCode
+
+from .base import MediaTestCase
+
+
+@override_settings(QR_BATCH={'WORKERS': 1, 'CHUNK_SIZE': 2})
+class BatchTests(MediaTestCase):
+
+    def post_items(self, items, output='zip'):
+        return self.client.post('/api/qr/batch/', {'items': items, 'output': output},
+                                content_type='application/json')
+
+    def post_file(self, name, body, **data):
+        upload = SimpleUploadedFile(name, body.encode('utf-8'))
+        return self.client.post('/api/qr/batch/', {'file': upload, 'output': 'jsonl', **data})
+
+    def jsonl(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_zip_has_every_image_and_a_manifest(self):
+        response = self.post_items([{'content': 'one'}, {'content_type': 'url', 'content': 'https://example.com'},
+                                    {'content': 'three', 'format': 'svg'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(names[-1], 'manifest.jsonl')
+        manifest = [json.loads(line) for line in archive.read('manifest.jsonl').splitlines()]
+        self.assertEqual([record['index'] for record in manifest], [0, 1, 2])
+        for name, record in zip(names, manifest):
+            qr_instance = QRCode.objects.get(id=record['qr_id'])
+            self.assertEqual(name, f"{record['index']:06d}_{qr_instance.id}.{qr_instance.image_format}")
+            with qr_instance.qr_image.open('rb') as stored:
+                self.assertEqual(archive.read(name), stored.read())
+        self.assertEqual(QRCode.objects.get(id=manifest[1]['qr_id']).content_type, 'url')
+        self.assertTrue(names[2].endswith('.svg'))
+
+    def test_jsonl_output(self):
+        records = self.jsonl(self.post_items([{'content': 'one'}, {'content': 'two'}], output='jsonl'))
+        self.assertEqual([record['content'] for record in records], ['one', 'two'])
+        self.assertEqual(QRCode.objects.count(), 2)
+
+    def test_items_are_persisted_chunk_by_chunk(self):
+        persist = batch.persist_batch_chunk
+        with mock.patch('generator.batch.persist_batch_chunk', side_effect=persist) as persisted:
+            records = self.jsonl(self.post_items([{'content': str(i)} for i in range(5)], output='jsonl'))
+        self.assertEqual([len(call.args[0]) for call in persisted.call_args_list], [2, 2, 1])
+        self.assertEqual([record['content'] for record in records], ['0', '1', '2', '3', '4'])
+
+    def test_invalid_items_are_reported_by_index(self):
+        response = self.post_items([
+            {'content': 'fine'},
+            {'content': ''},
+            {'content_type': 'pdf', 'content': 'x'},
+            {'content_type': 'url', 'content': 'not a url'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(sorted(errors), ['1', '2', '3'])
+        self.assertIn('text', errors['1'])
+        self.assertIn('content_type', errors['2'])
+        self.assertIn('url', errors['3'])
+        self.assertFalse(QRCode.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_items_or_file_is_required(self):
+        response = self.post_items([])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    @override_settings(QR_BATCH={'MAX_ITEMS': 2})
+    def test_too_many_items(self):
+        response = self.post_items([{'content': str(i)} for i in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.json()['errors'])
+        self.assertFalse(QRCode.objects.exists())
+
+    def test_csv_file(self):
+        records = self.jsonl(self.post_file('batch.csv', 'content,size,fill_color\none,5,\ntwo,,#FF0000\n'))
+        self.assertEqual([record['content'] for record in records], ['one', 'two'])
+        first, second = (QRCode.objects.get(id=record['qr_id']) for record in records)
+        self.assertEqual((first.size, first.fill_color), (5, '#000000'))
+        self.assertEqual((second.size, second.fill_color), (10, '#FF0000'))
+
+    def test_jsonl_file_with_default_content_type(self):
+        body = '{"content": "https://example.com"}\n\n{"content": "hello", "content_type": "text"}\n'
+        records = self.jsonl(self.post_file('batch.jsonl', body, content_type='url'))
+        self.assertEqual([QRCode.objects.get(id=record['qr_id']).content_type for record in records],
+                         ['url', 'text'])
+
+    def test_unparseable_files(self):
+        for name, body in (('batch.txt', 'hello'), ('batch.jsonl', '{"content": \n')):
+            with self.subTest(name=name):
+                response = self.post_file(name, body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('file', response.json()['errors'])
+        self.assertFalse(QRCode.objects.exists())
+
+
+class BatchExecutorTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch('generator.batch._executor', None))
+
+    @override_settings(QR_BATCH={'WORKERS': 1})
+    def test_single_worker_renders_inline(self):
+        self.assertIsNone(batch.get_batch_executor())
+
+    @override_settings(QR_BATCH={'WORKERS': 3})
+    def test_pool_is_shared_between_batches(self):
+        with mock.patch('generator.batch.ProcessPoolExecutor') as pool_class:
+            self.assertIs(batch.get_batch_executor(), batch.get_batch_executor())
+        pool_class.assert_called_once_with(max_workers=3)
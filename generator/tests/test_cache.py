@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from generator import encoding
+from generator.cache import get_matrix_cache
+from generator.utils import generate_qr_code
+
+
+class MatrixCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Fresh process-wide caches, built from each test's settings
+        self.enterContext(mock.patch('generator.cache._caches', {}))
+        encode = encoding.QR_ENCODERS['numpy']
+        self.encoder = mock.Mock(side_effect=encode)
+        self.enterContext(mock.patch.dict(encoding.QR_ENCODERS, {'numpy': self.encoder}))
+
+    def test_hit_returns_the_cached_matrix(self):
+        first = encoding.encode_qr('hello', 'M')
+        self.assertIs(encoding.encode_qr('hello', 'M'), first)
+        self.assertEqual(self.encoder.call_count, 1)
+        self.assertEqual(get_matrix_cache().stats()['hits'], 1)
+
+    def test_key_includes_error_correction(self):
+        encoding.encode_qr('hello', 'L')
+        encoding.encode_qr('hello', 'H')
+        self.assertEqual(self.encoder.call_count, 2)
+
+    def test_styled_variants_share_one_encode(self):
+        for size, fill_color in ((5, '#000000'), (10, '#FF0000'), (20, '#00FF00')):
+            generate_qr_code('styled', size=size, fill_color=fill_color)
+        self.assertEqual(self.encoder.call_count, 1)
+
+    @override_settings(QR_MATRIX_CACHE={'SHARED_CACHE': 'default', 'KEY_PREFIX': 'test:matrix:'})
+    def test_shared_tier_fills_a_cold_process(self):
+        self.addCleanup(cache.clear)
+        first = encoding.encode_qr('shared', 'Q')
+        # Another worker: empty local tier, same shared cache
+        get_matrix_cache().clear()
+        matrix = encoding.encode_qr('shared', 'Q')
+        self.assertTrue((matrix.modules == first.modules).all())
+        self.assertEqual(self.encoder.call_count, 1)
+        self.assertEqual(get_matrix_cache().stats()['shared_hits'], 1)
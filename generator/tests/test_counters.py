@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from generator.counters import flush_download_counts, record_download, record_downloads
+from generator.models import QRCode
+
+
+class DownloadCountTests(TestCase):
+
+    def test_unbuffered_downloads_update_in_place(self):
+        qr_instance = QRCode.objects.create(content_type='text', original_content='a', qr_data='a')
+        other = QRCode.objects.create(content_type='text', original_content='b', qr_data='b')
+        with self.assertNumQueries(1):
+            record_download(qr_instance)
+        with self.assertNumQueries(1):
+            record_downloads([qr_instance.pk, other.pk])
+        qr_instance.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(qr_instance.download_count, 2)
+        self.assertEqual(other.download_count, 1)
+        self.assertIsNotNone(other.last_downloaded)
+
+
+@override_settings(QR_DOWNLOAD_COUNTS={'BUFFERED': True})
+class BufferedDownloadCountTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.first = QRCode.objects.create(content_type='text', original_content='a', qr_data='a')
+        self.second = QRCode.objects.create(content_type='text', original_content='b', qr_data='b')
+
+    def test_flush_drains_epochs_two_behind(self):
+        for _ in range(3):
+            record_download(self.first)
+        record_download(self.second)
+
+        # The epoch written above is only one behind after the first flush
+        self.assertEqual(flush_download_counts(), 0)
+        record_download(self.first)
+        self.assertEqual(flush_download_counts(), 4)
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.download_count, 3)
+        self.assertEqual(self.second.download_count, 1)
+        self.assertIsNotNone(self.first.last_downloaded)
+
+        self.assertEqual(flush_download_counts(), 1)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.download_count, 4)
+        self.assertEqual(flush_download_counts(), 0)
@@ -0,0 +1,61 @@
+from django.http import FileResponse
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from generator.models import QRCode
+from generator.utils import save_qr_to_model
+
+from .base import MediaTestCase
+
+
+class DownloadTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.qr_instance = save_qr_to_model(
+            content_type='text', original_content='hello', file_obj=None, size=10,
+            fill_color='#000000', back_color='#FFFFFF', request=None,
+        )
+        self.url = reverse('download_qr', args=[self.qr_instance.id])
+
+    def download_count(self):
+        return QRCode.objects.get(pk=self.qr_instance.pk).download_count
+
+    def test_streams_stored_image(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, FileResponse)
+        with self.qr_instance.qr_image.open('rb') as stored:
+            self.assertEqual(b''.join(response.streaming_content), stored.read())
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn('must-revalidate', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.download_count(), 1)
+
+    def test_matching_etag_is_304_and_not_counted(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.download_count(), 1)
+
+    def test_if_modified_since_is_304(self):
+        since = http_date(self.qr_instance.created_at.timestamp() + 60)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.download_count(), 0)
+
+    def test_stale_etag_is_served_and_counted(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.download_count(), 1)
+
+    @override_settings(QR_DOWNLOAD_SENDFILE='x-accel-redirect', QR_DOWNLOAD_ACCEL_PREFIX='/protected-media/')
+    def test_accel_redirect_hands_file_to_web_server(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f"/protected-media/{self.qr_instance.qr_image.name}")
+        self.assertEqual(response.content, b'')
@@ -0,0 +1,40 @@
+from django.test import SimpleTestCase
+from qrcode import util
+
+from generator.encoding import ERROR_CORRECTION_LEVELS, _encode_numpy, _encode_qrcode
+
+
+class EncoderTests(SimpleTestCase):
+    """The numpy encoder must pick the same version and mask as qrcode"""
+
+    # Numeric, alphanumeric, byte and multi-byte UTF-8 segments
+    SAMPLES = {
+        'numeric': '0123456789',
+        'alphanumeric': 'HTTPS://QRTIST.EXAMPLE/',
+        'bytes': 'https://qrtist.example/?q=',
+        'utf8': 'Grüße, 二维码 ',
+    }
+
+    def assertSameMatrix(self, data, error_correction):
+        expected = _encode_qrcode(data, error_correction)
+        actual = _encode_numpy(data, error_correction)
+        self.assertEqual(actual.version, expected.version)
+        self.assertEqual(actual.mask_pattern, expected.mask_pattern)
+        self.assertTrue((actual.modules == expected.modules).all())
+        return expected.version
+
+    def test_matches_reference_across_versions(self):
+        # Longest byte-mode payload each version holds, from qrcode's tables
+        for error_correction, level in ERROR_CORRECTION_LEVELS.items():
+            for version in range(1, 41):
+                length_bits = util.mode_sizes_for_version(version)[util.MODE_8BIT_BYTE]
+                length = (util.BIT_LIMIT_TABLE[level][version] - 4 - length_bits) // 8
+                with self.subTest(error_correction=error_correction, version=version):
+                    self.assertEqual(self.assertSameMatrix('x' * length, error_correction), version)
+
+    def test_matches_reference_across_modes(self):
+        for error_correction in ERROR_CORRECTION_LEVELS:
+            for kind, sample in self.SAMPLES.items():
+                for repeat in (1, 5, 40):
+                    with self.subTest(error_correction=error_correction, kind=kind, repeat=repeat):
+                        self.assertSameMatrix(sample * repeat, error_correction)
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+
+from generator.export import EXPORT_FIELDS
+from generator.models import QRCode
+from generator.utils import save_qr_to_model
+
+from .base import MediaTestCase
+
+
+class ExportTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rows = [self.save(content_type, text) for content_type, text in
+                     (('text', 'first'), ('url', 'https://example.com'), ('text', 'third'))]
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+
+    def save(self, content_type, text):
+        qr_instance = save_qr_to_model(
+            content_type=content_type, original_content=text, file_obj=None, size=10,
+            fill_color='#000000', back_color='#FFFFFF', request=None,
+        )
+        # Distinct timestamps so the export order is defined
+        QRCode.objects.filter(pk=qr_instance.pk).update(
+            created_at=timezone.now() - timedelta(minutes=10 - QRCode.objects.count())
+        )
+        return qr_instance
+
+    def export(self, **params):
+        response = self.client.get('/api/qr/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/qr/export/').status_code, 403)
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get('/api/qr/export/').status_code, 403)
+
+    def test_jsonl(self):
+        response = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([record['id'] for record in records], [str(row.id) for row in self.rows])
+        self.assertEqual(list(records[0]), EXPORT_FIELDS)
+        self.assertEqual(records[1]['original_content'], 'https://example.com')
+
+    def test_csv_with_a_content_type_filter(self):
+        response = self.export(output='csv', content_type='text')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([row['original_content'] for row in rows], ['first', 'third'])
+
+    def test_zip_has_images_then_metadata(self):
+        self.rows[2].qr_image.storage.delete(self.rows[2].qr_image.name)
+        response = self.export(output='zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        # The missing image is only listed in the metadata
+        self.assertEqual(archive.namelist(), [
+            f"images/{self.rows[0].id}.png", f"images/{self.rows[1].id}.png", 'qr_codes.jsonl',
+        ])
+        with self.rows[0].qr_image.open('rb') as stored:
+            self.assertEqual(archive.read(f"images/{self.rows[0].id}.png"), stored.read())
+        self.assertEqual(len(archive.read('qr_codes.jsonl').splitlines()), 3)
+
+    def test_invalid_filters(self):
+        response = self.client.get('/api/qr/export/', {'output': 'xml', 'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json()['errors']), ['created_after', 'output'])
+
+    def test_command_writes_the_same_stream(self):
+        path = os.path.join(self.temporary_directory(), 'qr_codes.csv')
+        call_command('export_qr_codes', '--format', 'csv', '-o', path, '--chunk-size', '1',
+                     stdout=io.StringIO())
+        with open(path, encoding='utf-8', newline='') as exported:
+            self.assertEqual(exported.read(), b''.join(self.export(output='csv').streaming_content).decode('utf-8'))
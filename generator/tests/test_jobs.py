@@ -0,0 +1,108 @@
+import threading
+import uuid
+from datetime import timedelta
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from generator.jobs import claim_job, fail_expired_jobs, run_job, run_worker
+from generator.models import QRCode, QRJob
+
+from .base import MediaTestCase, pdf_upload
+
+
+class JobQueueTests(MediaTestCase):
+
+    def create_job(self, **fields):
+        return QRJob.objects.create(content_type='text', options={
+            'original_content': 'hello', 'size': 10, 'fill_color': '#000000', 'back_color': '#FFFFFF',
+            'error_correction': 'L', 'border': 4, 'image_format': 'png',
+        }, **fields)
+
+    def expire_lease(self, job):
+        QRJob.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_claim_leases_job_once(self):
+        job = self.create_job()
+        claimed = claim_job('worker-a')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, QRJob.STATUS_RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(claimed.locked_by, 'worker-a')
+        self.assertIsNone(claim_job('worker-b'))
+
+    def test_expired_lease_is_claimed_again(self):
+        self.create_job()
+        stale = claim_job('worker-a')
+        self.expire_lease(stale)
+
+        reclaimed = claim_job('worker-b')
+        self.assertEqual(reclaimed.pk, stale.pk)
+        self.assertEqual(reclaimed.attempts, 2)
+        self.assertEqual(reclaimed.locked_by, 'worker-b')
+
+        # The first worker finishing late must not overwrite the new lease
+        with self.assertLogs('generator.jobs', 'WARNING'):
+            run_job(stale)
+        reclaimed.refresh_from_db()
+        self.assertEqual(reclaimed.status, QRJob.STATUS_RUNNING)
+        self.assertEqual(reclaimed.locked_by, 'worker-b')
+
+        self.assertEqual(run_job(reclaimed), QRJob.STATUS_SUCCEEDED)
+        reclaimed.refresh_from_db()
+        self.assertEqual(reclaimed.status, QRJob.STATUS_SUCCEEDED)
+        self.assertIsNotNone(reclaimed.result)
+
+    def test_expired_last_attempt_fails(self):
+        self.create_job(max_attempts=1)
+        job = claim_job('worker-a')
+        self.expire_lease(job)
+        self.assertIsNone(claim_job('worker-b'))
+        self.assertEqual(fail_expired_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, QRJob.STATUS_FAILED)
+        self.assertEqual(job.error, 'Visibility timeout expired')
+
+    def test_async_request_is_queued_then_reported(self):
+        response = self.client.post('/api/qr/text/?async=true', {'text': 'hello'})
+        self.assertEqual(response.status_code, 202)
+        payload = response.json()
+        self.assertEqual(payload['status'], QRJob.STATUS_QUEUED)
+        self.assertEqual(response['Location'], payload['status_url'])
+        self.assertFalse(QRCode.objects.exists())
+
+        with self.assertLogs('generator.jobs', 'INFO'):
+            self.assertEqual(run_worker('worker-a', threading.Event(), once=True), 1)
+        payload = self.client.get(payload['status_url']).json()
+        self.assertEqual(payload['status'], QRJob.STATUS_SUCCEEDED)
+        qr_instance = QRCode.objects.get(id=payload['result']['qr_id'])
+        self.assertEqual(qr_instance.original_content, 'hello')
+
+    def test_staged_upload_is_removed_after_the_job(self):
+        response = self.client.post('/api/qr/pdf/?async=true', {'file': pdf_upload()})
+        self.assertEqual(response.status_code, 202)
+        job = QRJob.objects.get(id=response.json()['job_id'])
+        staged = job.upload.name
+        self.assertIn(staged, self.stored_files())
+
+        with self.assertLogs('generator.jobs', 'INFO'):
+            run_worker('worker-a', threading.Event(), once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, QRJob.STATUS_SUCCEEDED)
+        self.assertFalse(job.upload)
+        self.assertNotIn(staged, self.stored_files())
+        # The QR code keeps its own copy of the upload
+        self.assertIn(job.result.file.name, self.stored_files())
+
+    @override_settings(QR_JOBS={'MAX_QUEUED': 1})
+    def test_full_queue_answers_503(self):
+        self.create_job()
+        response = self.client.post('/api/qr/text/?async=true', {'text': 'hello'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(QRJob.objects.count(), 1)
+
+    def test_unknown_job_is_404(self):
+        response = self.client.get(reverse('api_qr_job', args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, 404)
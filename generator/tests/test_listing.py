@@ -0,0 +1,54 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from generator.models import QRCode
+from generator.views import QRCodeCursorPagination
+
+
+# An OFFSET through the tied rows would be capped below the 7 it needs
+@override_settings(SECURE_SSL_REDIRECT=False)
+@mock.patch.object(QRCodeCursorPagination, 'offset_cutoff', 2)
+class CursorPaginationTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        # A bulk insert sharing one timestamp, between older and newer rows
+        rows = [QRCode(content_type='text', original_content=f"same {index}", created_at=now)
+                for index in range(7)]
+        rows += [QRCode(content_type='text', original_content=f"other {index}",
+                        created_at=now + timedelta(seconds=offset))
+                 for index, offset in enumerate((-2, -1, 1, 2))]
+        QRCode.objects.bulk_create(rows)
+        self.expected = [
+            str(pk) for pk in QRCode.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        ]
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            # Repeated rows would otherwise page forever
+            self.assertLessEqual(len(pages), len(self.expected))
+            payload = self.client.get(url).json()
+            pages.append([row['id'] for row in payload['results']])
+            url = payload[link]
+        return pages
+
+    def test_pages_forward_without_gaps_or_repeats(self):
+        pages = self.walk('/api/qr/list?page_size=3', 'next')
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_pages_back_from_the_last_page(self):
+        forward = self.walk('/api/qr/list?page_size=3', 'next')
+        last = self.client.get('/api/qr/list?page_size=3').json()
+        while last['next']:
+            last = self.client.get(last['next']).json()
+        backward = self.walk(last['previous'], 'previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get('/api/qr/list?cursor=cD1ub3QtYS1wb3NpdGlvbg%3D%3D')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+
+from .base import MediaTestCase
+
+
+class MetricsAccessTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        self.user = User.objects.create_user('user')
+
+    def test_hidden_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_open_to_staff(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'qr_request_duration_seconds', response.content)
+
+    @override_settings(QR_METRICS_TOKEN='secret')
+    def test_token_lets_scrapers_in(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class ServerTimingTests(MediaTestCase):
+
+    def test_sent_to_staff_only_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.post('/api/qr/text/', {'text': 'hello'}))
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        timing = self.client.post('/api/qr/text/', {'text': 'hello'})['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_modes(self):
+        for mode, expected in (('all', True), ('off', False)):
+            with self.subTest(mode=mode), override_settings(QR_SERVER_TIMING=mode):
+                response = self.client.get('/api/qr/list')
+                self.assertEqual('Server-Timing' in response, expected)
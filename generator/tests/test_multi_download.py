@@ -0,0 +1,70 @@
+import io
+import uuid
+import zipfile
+
+from django.test import override_settings
+
+from generator.models import QRCode
+from generator.utils import save_qr_to_model
+
+from .base import MediaTestCase
+
+
+class MultiDownloadTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rows = [
+            save_qr_to_model(
+                content_type='text', original_content=text, file_obj=None, size=10,
+                fill_color='#000000', back_color='#FFFFFF', request=None,
+            )
+            for text in ('one', 'two', 'three')
+        ]
+
+    def post(self, ids):
+        return self.client.post('/api/qr/download/', {'ids': [str(qr_id) for qr_id in ids]},
+                                content_type='application/json')
+
+    def archive(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_zip_in_request_order_with_one_bulk_update(self):
+        ids = [self.rows[2].id, self.rows[0].id, self.rows[2].id]
+        # The lookup, then one UPDATE for every counted row
+        with self.assertNumQueries(2) as queries:
+            response = self.post(ids)
+        self.assertEqual([query['sql'].split()[0] for query in queries.captured_queries], ['SELECT', 'UPDATE'])
+
+        archive = self.archive(response)
+        self.assertEqual(archive.namelist(), [f"qr_{self.rows[2].id}.png", f"qr_{self.rows[0].id}.png"])
+        with self.rows[0].qr_image.open('rb') as stored:
+            self.assertEqual(archive.read(f"qr_{self.rows[0].id}.png"), stored.read())
+        counts = dict(QRCode.objects.values_list('id', 'download_count'))
+        self.assertEqual(counts, {self.rows[0].id: 1, self.rows[1].id: 0, self.rows[2].id: 1})
+
+    def test_unknown_ids_are_400(self):
+        unknown = uuid.uuid4()
+        response = self.post([self.rows[0].id, unknown])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(unknown), response.json()['errors']['ids'][0])
+        self.assertFalse(QRCode.objects.filter(download_count__gt=0).exists())
+
+    @override_settings(QR_BATCH={'MAX_DOWNLOAD_IDS': 2})
+    def test_too_many_ids_are_400(self):
+        response = self.post([row.id for row in self.rows])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ids', response.json()['errors'])
+
+    def test_empty_or_malformed_ids_are_400(self):
+        for ids in ([], ['not-a-uuid']):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.post(ids).status_code, 400)
+
+    def test_missing_image_is_left_out(self):
+        self.rows[1].qr_image.storage.delete(self.rows[1].qr_image.name)
+        with self.assertLogs('generator.utils', 'WARNING'):
+            archive = self.archive(self.post([row.id for row in self.rows]))
+        self.assertEqual(archive.namelist(), [f"qr_{self.rows[0].id}.png", f"qr_{self.rows[2].id}.png"])
@@ -0,0 +1,78 @@
+import base64
+import io
+
+from PIL import Image
+
+from generator.models import QRCode
+
+from .base import MediaTestCase
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class ContentNegotiationTests(MediaTestCase):
+
+    def stored_image(self, qr_id):
+        qr_instance = QRCode.objects.get(id=qr_id)
+        with qr_instance.qr_image.open('rb') as stored:
+            return stored.read()
+
+    def test_json_embeds_the_stored_image(self):
+        response = self.client.post('/api/qr/text/', {'text': 'hello'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        payload = response.json()
+        prefix = 'data:image/png;base64,'
+        self.assertTrue(payload['qr_code'].startswith(prefix))
+        self.assertEqual(base64.b64decode(payload['qr_code'][len(prefix):]), self.stored_image(payload['qr_id']))
+
+    def test_embed_false_links_the_image(self):
+        payload = self.client.post('/api/qr/text/?embed=false', {'text': 'hello'}).json()
+        self.assertNotIn('qr_code', payload)
+        self.assertEqual(payload['image_url'], QRCode.objects.get(id=payload['qr_id']).qr_image.url)
+
+    def test_accept_png_returns_raw_image(self):
+        response = self.client.post('/api/qr/text/', {'text': 'hello'}, HTTP_ACCEPT='image/png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(PNG_SIGNATURE))
+        self.assertEqual(response.content, self.stored_image(response['X-QR-ID']))
+        self.assertIn('inline', response['Content-Disposition'])
+
+    def test_errors_are_json_when_an_image_was_accepted(self):
+        response = self.client.post('/api/qr/text/', {'text': ''}, HTTP_ACCEPT='image/png')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertFalse(response.json()['success'])
+        self.assertIn('text', response.json()['errors'])
+        self.assertFalse(QRCode.objects.exists())
+
+
+class OutputFormatTests(MediaTestCase):
+
+    def test_accept_webp_and_svg(self):
+        for media_type, signature in (('image/webp', b'RIFF'), ('image/svg+xml', b'<?xml')):
+            with self.subTest(media_type=media_type):
+                response = self.client.post('/api/qr/text/', {'text': 'hello'}, HTTP_ACCEPT=media_type)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], media_type)
+                self.assertTrue(response.content.startswith(signature))
+                self.assertTrue(QRCode.objects.filter(id=response['X-QR-ID']).exists())
+
+    def test_format_sets_the_stored_image(self):
+        for image_format, media_type in (('webp', 'image/webp'), ('svg', 'image/svg+xml')):
+            with self.subTest(image_format=image_format):
+                payload = self.client.post('/api/qr/text/', {'text': 'hello', 'format': image_format}).json()
+                qr_instance = QRCode.objects.get(id=payload['qr_id'])
+                self.assertEqual(qr_instance.image_format, image_format)
+                self.assertTrue(qr_instance.qr_image.name.endswith(f".{image_format}"))
+                self.assertTrue(payload['qr_code'].startswith(f"data:{media_type};base64,"))
+
+    def test_png_is_palette_encoded(self):
+        payload = self.client.post('/api/qr/text/', {'text': 'hello', 'fill_color': '#FF0000'}).json()
+        with QRCode.objects.get(id=payload['qr_id']).qr_image.open('rb') as stored:
+            image = Image.open(io.BytesIO(stored.read()))
+        self.assertEqual(image.mode, 'P')
+        colors = {color for _, color in image.convert('RGB').getcolors()}
+        self.assertIn((255, 0, 0), colors)
+        self.assertIn((255, 255, 255), colors)
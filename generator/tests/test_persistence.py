@@ -0,0 +1,126 @@
+import hashlib
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import override_settings
+
+from generator.cache import get_render_cache
+from generator.models import QRCode
+from generator.utils import generate_qr_code, save_qr_to_model
+
+from .base import MediaTestCase, pdf_upload
+
+
+def save_text(text, **options):
+    return save_qr_to_model(**{
+        'content_type': 'text', 'original_content': text, 'file_obj': None, 'size': 10,
+        'fill_color': '#000000', 'back_color': '#FFFFFF', 'request': None, **options,
+    })
+
+
+class RenderReuseTests(MediaTestCase):
+
+    def test_identical_renders_share_one_stored_image(self):
+        first = save_text('hello')
+        second = save_text('hello')
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(first.qr_image.name, second.qr_image.name)
+        self.assertEqual(self.stored_files(), [first.qr_image.name])
+
+    def test_different_styling_is_stored_separately(self):
+        first = save_text('hello')
+        second = save_text('hello', fill_color='#FF0000')
+        self.assertNotEqual(first.qr_image.name, second.qr_image.name)
+        self.assertEqual(len(self.stored_files()), 2)
+
+    @override_settings(QR_REUSE_RENDERED_IMAGES=False)
+    def test_reuse_can_be_turned_off(self):
+        save_text('hello')
+        save_text('hello')
+        self.assertEqual(len(self.stored_files()), 2)
+
+    def test_missing_file_is_not_reused(self):
+        first = save_text('hello')
+        first.qr_image.storage.delete(first.qr_image.name)
+        second = save_text('hello')
+        self.assertNotEqual(first.qr_image.name, second.qr_image.name)
+        self.assertEqual(self.stored_files(), [second.qr_image.name])
+
+    def test_render_cache_returns_same_bytes(self):
+        cache = get_render_cache()
+        image = generate_qr_code('render cache', size=7).getvalue()
+        hits = cache.stats()['hits']
+        self.assertEqual(generate_qr_code('render cache', size=7).getvalue(), image)
+        self.assertEqual(cache.stats()['hits'], hits + 1)
+
+
+class UploadDeduplicationTests(MediaTestCase):
+
+    def upload(self, **kwargs):
+        response = self.client.post('/api/qr/pdf/', {'file': pdf_upload(**kwargs)})
+        self.assertEqual(response.status_code, 200)
+        return QRCode.objects.get(id=response.json()['qr_id'])
+
+    def test_upload_hash_and_size_are_recorded(self):
+        upload = pdf_upload()
+        content = upload.read()
+        qr_instance = self.upload()
+        self.assertEqual(qr_instance.file_sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(qr_instance.file_size_bytes, len(content))
+
+    def test_identical_uploads_share_one_stored_file(self):
+        first = self.upload(name='first.pdf')
+        second = self.upload(name='second.pdf')
+        self.assertEqual(first.file.name, second.file.name)
+        uploads = [name for name in self.stored_files() if name.startswith('uploads/')]
+        self.assertEqual(uploads, [first.file.name])
+
+    def test_different_uploads_are_stored_separately(self):
+        first = self.upload(body=b'first')
+        second = self.upload(body=b'second')
+        self.assertNotEqual(first.file_sha256, second.file_sha256)
+        self.assertNotEqual(first.file.name, second.file.name)
+
+    @override_settings(QR_DEDUPLICATE_UPLOADS=False)
+    def test_deduplication_can_be_turned_off(self):
+        first = self.upload()
+        second = self.upload()
+        self.assertEqual(first.file_sha256, second.file_sha256)
+        self.assertNotEqual(first.file.name, second.file.name)
+
+
+class SingleWriteTests(MediaTestCase):
+
+    def save_upload(self, name, body=b'hello'):
+        return save_qr_to_model(
+            content_type='pdf', original_content='', file_obj=pdf_upload(name, body), size=10,
+            fill_color='#000000', back_color='#FFFFFF', request=None,
+        )
+
+    def test_save_is_one_insert(self):
+        # The reuse lookup, then the row; no UPDATE for the files afterwards
+        with self.assertNumQueries(2) as queries:
+            qr_instance = save_text('hello')
+        self.assertEqual([query['sql'].split()[0] for query in queries.captured_queries], ['SELECT', 'INSERT'])
+        self.assertTrue(QRCode.objects.filter(pk=qr_instance.pk, qr_image=qr_instance.qr_image.name).exists())
+
+    def test_failed_insert_removes_new_files(self):
+        self.failing_save(self.save_upload, 'document.pdf')
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(QRCode.objects.exists())
+
+    def failing_save(self, save, *args):
+        with mock.patch.object(QRCode, 'save', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                save(*args)
+
+    def test_failed_insert_keeps_reused_upload(self):
+        first = self.save_upload('first.pdf')
+        # Same upload, so its file is reused; another name, so a new image
+        self.failing_save(self.save_upload, 'second.pdf')
+        self.assertEqual(self.stored_files(), sorted([first.file.name, first.qr_image.name]))
+
+    def test_failed_insert_keeps_reused_image(self):
+        first = save_text('hello')
+        self.failing_save(save_text, 'hello')
+        self.assertEqual(self.stored_files(), [first.qr_image.name])
@@ -0,0 +1,107 @@
+import io
+import os
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.utils import timezone
+
+from generator.management.commands import purge_qr_codes
+from generator.models import QRCode, QRJob
+from generator.utils import save_qr_to_model
+
+from .base import MediaTestCase
+
+
+class PurgeTests(MediaTestCase):
+
+    def save_text(self, text, days_old=0, **fields):
+        qr_instance = save_qr_to_model(
+            content_type='text', original_content=text, file_obj=None, size=10,
+            fill_color='#000000', back_color='#FFFFFF', request=None,
+        )
+        QRCode.objects.filter(pk=qr_instance.pk).update(
+            created_at=timezone.now() - timedelta(days=days_old), **fields
+        )
+        return qr_instance
+
+    def purge(self, *args):
+        call_command('purge_qr_codes', '--days', '30', '--reuse-grace-seconds', '0', *args,
+                     stdout=io.StringIO())
+
+    def age_file(self, name, hours):
+        path = os.path.join(self.media_root, name)
+        mtime = time.time() - hours * 3600
+        os.utime(path, (mtime, mtime))
+
+    def test_expired_rows_and_their_files_are_deleted(self):
+        old = self.save_text('old', days_old=40)
+        new = self.save_text('new')
+        self.purge('--skip-orphans')
+        self.assertEqual(list(QRCode.objects.values_list('pk', flat=True)), [new.pk])
+        self.assertEqual(self.stored_files(), [new.qr_image.name])
+        self.assertNotIn(old.qr_image.name, self.stored_files())
+
+    def test_file_shared_with_a_surviving_row_is_kept(self):
+        old = self.save_text('shared', days_old=40)
+        new = self.save_text('shared')
+        self.assertEqual(old.qr_image.name, new.qr_image.name)
+        self.purge('--skip-orphans')
+        self.assertFalse(QRCode.objects.filter(pk=old.pk).exists())
+        self.assertEqual(self.stored_files(), [new.qr_image.name])
+
+    def test_recent_download_keeps_an_expired_row(self):
+        kept = self.save_text('downloaded', days_old=40, last_downloaded=timezone.now())
+        self.purge('--skip-orphans', '--keep-downloaded-days', '7')
+        self.assertTrue(QRCode.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(self.stored_files(), [kept.qr_image.name])
+
+    def test_file_reused_during_the_grace_period_is_kept(self):
+        old = self.save_text('shared', days_old=40)
+        sleep = time.sleep
+
+        def reuse_then_sleep(seconds):
+            # A save that found the file through the old row inserts its own
+            QRCode.objects.create(content_type='text', original_content='shared', qr_data='shared',
+                                  qr_image=old.qr_image.name, render_hash=old.render_hash)
+            sleep(seconds)
+
+        with mock.patch.object(purge_qr_codes.time, 'sleep', reuse_then_sleep):
+            call_command('purge_qr_codes', '--days', '30', '--skip-orphans',
+                         '--reuse-grace-seconds', '1', stdout=io.StringIO())
+        self.assertFalse(QRCode.objects.filter(pk=old.pk).exists())
+        self.assertEqual(self.stored_files(), [old.qr_image.name])
+
+    def test_orphans_are_swept_after_the_grace_window(self):
+        referenced = self.save_text('referenced')
+        self.age_file(referenced.qr_image.name, hours=48)
+        storage = referenced.qr_image.storage
+        stale = storage.save('qr_codes/stale.png', ContentFile(b'stale'))
+        fresh = storage.save('uploads/fresh.pdf', ContentFile(b'fresh'))
+        self.age_file(stale, hours=48)
+
+        self.purge('--skip-records', '--orphan-grace-hours', '24')
+        self.assertEqual(self.stored_files(), sorted([referenced.qr_image.name, fresh]))
+
+    def test_dry_run_deletes_nothing(self):
+        old = self.save_text('old', days_old=40)
+        storage = old.qr_image.storage
+        orphan = storage.save('qr_codes/orphan.png', ContentFile(b'orphan'))
+        self.age_file(orphan, hours=48)
+        QRJob.objects.create(content_type='text', status=QRJob.STATUS_SUCCEEDED,
+                             created_at=timezone.now() - timedelta(days=40))
+        files = self.stored_files()
+
+        self.purge('--dry-run')
+        self.assertTrue(QRCode.objects.filter(pk=old.pk).exists())
+        self.assertEqual(QRJob.objects.count(), 1)
+        self.assertEqual(self.stored_files(), files)
+
+    def test_finished_jobs_past_retention_are_deleted(self):
+        old = timezone.now() - timedelta(days=40)
+        QRJob.objects.create(content_type='text', status=QRJob.STATUS_SUCCEEDED, created_at=old)
+        queued = QRJob.objects.create(content_type='text', created_at=old)
+        self.purge('--skip-orphans')
+        self.assertEqual(list(QRJob.objects.values_list('pk', flat=True)), [queued.pk])
@@ -0,0 +1,74 @@
+import io
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+
+from generator.models import QRCode
+
+from .base import MediaTestCase
+
+
+class RelocateMediaTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.storage = QRCode._meta.get_field('qr_image').storage
+        # Flat-layout names, one image shared by two rows
+        self.image = self.storage.save('qr_codes/abcdef0123.png', ContentFile(b'image'))
+        self.upload = self.storage.save('uploads/pdf/fedcba9876.pdf', ContentFile(b'%PDF-1.4'))
+        self.rows = [
+            QRCode.objects.create(content_type='text', original_content='a', qr_image=self.image),
+            QRCode.objects.create(content_type='text', original_content='a', qr_image=self.image),
+            QRCode.objects.create(content_type='pdf', qr_image=self.image, file=self.upload),
+        ]
+
+    def relocate(self, *args):
+        output = io.StringIO()
+        call_command('relocate_media', '--workers', '2', *args, stdout=output)
+        return output.getvalue()
+
+    def stored_names(self, field_name):
+        return set(QRCode.objects.values_list(field_name, flat=True))
+
+    def test_files_and_rows_move_to_sharded_names(self):
+        self.relocate()
+        self.assertEqual(self.stored_names('qr_image'), {'qr_codes/ab/cd/abcdef0123.png'})
+        self.assertEqual(self.stored_names('file'), {'', 'uploads/pdf/fe/dc/fedcba9876.pdf'})
+        self.assertEqual(self.stored_files(), ['qr_codes/ab/cd/abcdef0123.png', 'uploads/pdf/fe/dc/fedcba9876.pdf'])
+        with self.storage.open('qr_codes/ab/cd/abcdef0123.png') as moved:
+            self.assertEqual(moved.read(), b'image')
+
+    def test_second_run_is_a_no_op(self):
+        self.relocate()
+        files = self.stored_files()
+        with self.assertNumQueries(2):  # One pending-name query per field, no UPDATEs
+            self.relocate()
+        self.assertEqual(self.stored_files(), files)
+        self.assertEqual(self.stored_names('qr_image'), {'qr_codes/ab/cd/abcdef0123.png'})
+
+    def test_rerun_after_an_interrupted_copy(self):
+        # Copied by an earlier run that stopped before the UPDATE
+        self.storage.save('qr_codes/ab/cd/abcdef0123.png', ContentFile(b'image'))
+        self.relocate()
+        self.assertEqual(self.stored_names('qr_image'), {'qr_codes/ab/cd/abcdef0123.png'})
+        self.assertEqual(self.stored_files(), ['qr_codes/ab/cd/abcdef0123.png', 'uploads/pdf/fe/dc/fedcba9876.pdf'])
+
+    def test_dry_run_changes_nothing(self):
+        files = self.stored_files()
+        output = self.relocate('--dry-run')
+        self.assertIn('qr_image: 1 files would be relocated', output)
+        self.assertIn('file: 1 files would be relocated', output)
+        self.assertEqual(self.stored_files(), files)
+        self.assertEqual(self.stored_names('qr_image'), {self.image})
+
+    def test_keep_old_leaves_the_flat_files(self):
+        self.relocate('--keep-old')
+        self.assertEqual(len(self.stored_files()), 4)
+        self.assertEqual(self.stored_names('qr_image'), {'qr_codes/ab/cd/abcdef0123.png'})
+
+    def test_missing_source_is_skipped(self):
+        self.storage.delete(self.upload)
+        output = self.relocate()
+        self.assertIn('1 missing sources skipped', output)
+        self.assertEqual(self.stored_names('file'), {'', self.upload})
+        self.assertEqual(self.stored_names('qr_image'), {'qr_codes/ab/cd/abcdef0123.png'})
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from generator.models import QRCode
+from generator.stats import compute_qr_stats, get_qr_stats
+
+from .base import MediaTestCase
+
+
+class StatsTests(MediaTestCase):
+
+    def create(self, content_type, download_count=0, **fields):
+        return QRCode.objects.create(content_type=content_type, original_content=content_type,
+                                     download_count=download_count, **fields)
+
+    def test_counts_by_type_in_one_aggregate(self):
+        self.create('text', 2)
+        self.create('text', 1, last_downloaded=timezone.now())
+        top = self.create('url', 5, last_downloaded=timezone.now() - timedelta(hours=1))
+        QRCode.objects.filter(pk=self.create('pdf').pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        # The aggregate, the most downloaded row and the recent activity
+        with self.assertNumQueries(3):
+            stats = compute_qr_stats()
+        self.assertEqual(stats['by_type'], {'text': 2, 'url': 1, 'pdf': 1, 'image': 0})
+        self.assertEqual(stats['total_qrs'], 4)
+        self.assertEqual(stats['total_downloads'], 8)
+        self.assertEqual(stats['today_count'], 3)
+        self.assertEqual(stats['most_downloaded'], top)
+        self.assertEqual([qr.content_type for qr in stats['recent_activity']], ['text', 'url'])
+
+    def test_empty_table(self):
+        stats = compute_qr_stats()
+        self.assertEqual(stats['by_type'], {'text': 0, 'url': 0, 'pdf': 0, 'image': 0})
+        self.assertEqual((stats['total_qrs'], stats['total_downloads']), (0, 0))
+        self.assertIsNone(stats['most_downloaded'])
+
+    def test_snapshot_is_cached(self):
+        self.create('text')
+        self.assertEqual(get_qr_stats()['total_qrs'], 1)
+        self.create('url')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_qr_stats()['total_qrs'], 1)
+
+    @override_settings(QR_STATS_CACHE_TTL=0)
+    def test_cache_can_be_turned_off(self):
+        self.create('text')
+        get_qr_stats()
+        self.create('url')
+        self.assertEqual(get_qr_stats()['total_qrs'], 2)
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import RequestFactory, override_settings
+
+from generator.models import QRCode
+from generator.throttling import take_tokens
+
+from .base import MediaTestCase
+
+
+@override_settings(QR_THROTTLE={
+    'ENABLED': True, 'CLIENT_RATE': 1.0, 'CLIENT_BURST': 3, 'GLOBAL_RATE': 10.0, 'GLOBAL_BURST': 5,
+})
+class ThrottleTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        self.enterContext(mock.patch('generator.throttling.time.time', side_effect=lambda: self.now))
+
+    def request(self, ip='10.0.0.1'):
+        return RequestFactory().post('/', REMOTE_ADDR=ip)
+
+    def test_burst_then_refill(self):
+        for _ in range(3):
+            self.assertIsNone(take_tokens(self.request(), 'text', 1))
+        self.assertAlmostEqual(take_tokens(self.request(), 'text', 1), 1.0)
+        self.now += 1
+        self.assertIsNone(take_tokens(self.request(), 'text', 1))
+
+    def test_large_cost_leaves_debt(self):
+        # Admitted once the bucket is full, then charged in full
+        self.assertIsNone(take_tokens(self.request(), 'batch', 10))
+        self.assertAlmostEqual(take_tokens(self.request(), 'text', 1), 8.0)
+        self.now += 8
+        self.assertIsNone(take_tokens(self.request(), 'text', 1))
+
+    def test_global_bucket_is_shared_between_clients(self):
+        for index in range(5):
+            self.assertIsNone(take_tokens(self.request(f"10.0.0.{index}"), 'text', 1))
+        self.assertAlmostEqual(take_tokens(self.request('10.0.0.9'), 'text', 1), 0.1)
+
+    def test_view_answers_429_with_retry_after(self):
+        for _ in range(3):
+            self.assertEqual(self.client.post('/api/qr/text/', {'text': 'hello'}).status_code, 200)
+        response = self.client.post('/api/qr/text/', {'text': 'hello'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(QRCode.objects.count(), 3)
@@ -0,0 +1,57 @@
+import hashlib
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+
+from generator.models import QRCode
+from generator.uploads import StreamingUploadHandler
+
+from .base import MediaTestCase, pdf_upload
+
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+class StreamingUploadTests(MediaTestCase):
+
+    def assertRejected(self, url, upload):
+        response = self.client.post(url, {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.json()['errors'])
+        self.assertFalse(QRCode.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_renamed_file_is_rejected_by_magic_bytes(self):
+        self.assertRejected('/api/qr/pdf/', SimpleUploadedFile(
+            'document.pdf', PNG_HEADER, content_type='application/pdf'
+        ))
+
+    def test_pdf_is_rejected_by_the_image_endpoint(self):
+        self.assertRejected('/api/qr/image/', pdf_upload('picture.png'))
+
+    @override_settings(QR_UPLOAD={'MAX_FILE_SIZE': 1024, 'CHUNK_SIZE': 256})
+    def test_oversized_file_is_rejected(self):
+        self.assertRejected('/api/qr/pdf/', pdf_upload(body=b'x' * 2048))
+
+    @override_settings(QR_UPLOAD={'CHUNK_SIZE': 256})
+    def test_accepted_upload_is_hashed_across_chunks(self):
+        upload = pdf_upload(body=b'0123456789' * 100)
+        content = upload.read()
+        upload.seek(0)
+        receive = StreamingUploadHandler.receive_data_chunk
+        with mock.patch.object(StreamingUploadHandler, 'receive_data_chunk', autospec=True,
+                               side_effect=receive) as received:
+            response = self.client.post('/api/qr/pdf/', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(received.call_count, 1)
+        qr_instance = QRCode.objects.get(id=response.json()['qr_id'])
+        self.assertEqual(qr_instance.file_sha256, hashlib.sha256(content).hexdigest())
+        with qr_instance.file.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_image_endpoint_accepts_png_by_content(self):
+        response = self.client.post('/api/qr/image/', {'file': SimpleUploadedFile(
+            'picture.bin', PNG_HEADER, content_type='application/octet-stream'
+        )})
+        self.assertEqual(response.status_code, 200)
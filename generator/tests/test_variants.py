@@ -0,0 +1,81 @@
+import io
+import os
+
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image
+
+from generator.models import QRCode
+from generator.utils import save_qr_to_model
+
+from .base import MediaTestCase, pdf_upload
+
+
+class VariantDownloadTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.qr_instance = save_qr_to_model(
+            content_type='text', original_content='hello', file_obj=None, size=10,
+            fill_color='#000000', back_color='#FFFFFF', request=None,
+        )
+        self.url = reverse('download_qr', args=[self.qr_instance.id])
+
+    def variant_files(self):
+        return [name for _, _, names in os.walk(settings.QR_VARIANTS['CACHE_DIR']) for name in names]
+
+    def test_resized_variant_fits_the_requested_width(self):
+        response = self.client.get(self.url, {'px': 200})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        image = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        # 21 modules plus the 4-module border on each side
+        self.assertEqual(image.size, (200 // 29 * 29,) * 2)
+        self.assertEqual(len(self.variant_files()), 1)
+
+        # Served from the variant cache the second time
+        self.client.get(self.url, {'px': 200})
+        self.assertEqual(len(self.variant_files()), 1)
+        self.assertEqual(QRCode.objects.get(pk=self.qr_instance.pk).download_count, 2)
+
+    def test_format_variants(self):
+        for image_format, media_type, signature in (('webp', 'image/webp', b'RIFF'),
+                                                    ('svg', 'image/svg+xml', b'<?xml')):
+            with self.subTest(image_format=image_format):
+                response = self.client.get(self.url, {'px': 300, 'format': image_format})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], media_type)
+                self.assertTrue(b''.join(response.streaming_content).startswith(signature))
+
+    def test_stored_format_without_px_is_the_stored_file(self):
+        response = self.client.get(self.url, {'format': 'png'})
+        with self.qr_instance.qr_image.open('rb') as stored:
+            self.assertEqual(b''.join(response.streaming_content), stored.read())
+        self.assertEqual(self.variant_files(), [])
+
+    def test_variant_revalidation_is_304(self):
+        etag = self.client.get(self.url, {'px': 200})['ETag']
+        response = self.client.get(self.url, {'px': 200}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(etag, self.client.get(self.url, {'px': 400})['ETag'])
+
+    def test_out_of_range_px_is_400(self):
+        for px in (8, 10000):
+            with self.subTest(px=px):
+                self.assertEqual(self.client.get(self.url, {'px': px}).status_code, 400)
+
+    def test_file_code_without_qr_data_is_409(self):
+        # Saved before qr_data was recorded; what it encoded is unknown
+        legacy = save_qr_to_model(
+            content_type='pdf', original_content='', file_obj=pdf_upload(), size=10,
+            fill_color='#000000', back_color='#FFFFFF', request=None,
+        )
+        QRCode.objects.filter(pk=legacy.pk).update(qr_data='')
+        url = reverse('download_qr', args=[legacy.id])
+        for params in ({'px': 200}, {'format': 'svg'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 409)
+                self.assertFalse(response.json()['success'])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.variant_files(), [])
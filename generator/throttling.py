@@ -0,0 +1,109 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import Counter, register_metric
+from .utils import get_client_ip
+
+
+DEFAULT_THROTTLE_SETTINGS = {
+    'ENABLED': True,
+    'CACHE': 'default',  # Must be shared between workers for limits to be global
+    'KEY_PREFIX': 'qr:throttle:',
+    'CLIENT_RATE': 2.0,  # Tokens refilled per second, per client IP
+    'CLIENT_BURST': 30,  # Bucket capacity, per client IP
+    'GLOBAL_RATE': 50.0,
+    'GLOBAL_BURST': 300,
+    # Tokens charged per request by scope; batches add 'batch_item' per item
+    'COSTS': {
+        'text': 1,
+        'url': 1,
+        'pdf': 5,
+        'image': 5,
+        'batch': 1,
+        'batch_item': 0.2,
+    },
+}
+
+throttle_admitted = register_metric(Counter(
+    'qr_throttle_admitted_total', 'Generation requests admitted by the token buckets.', 'scope'
+))
+throttle_rejected = register_metric(Counter(
+    'qr_throttle_rejected_total', 'Generation requests answered 429, by the bucket that was empty.', 'bucket'
+))
+throttle_tokens = register_metric(Counter(
+    'qr_throttle_tokens_total', 'Tokens charged to admitted requests.', 'scope'
+))
+
+
+def get_throttle_setting(name):
+    return {**DEFAULT_THROTTLE_SETTINGS, **getattr(settings, 'QR_THROTTLE', {})}[name]
+
+
+def get_throttle_cost(scope):
+    """Tokens charged for one request of scope, or for one item with 'batch_item'"""
+    return {**DEFAULT_THROTTLE_SETTINGS['COSTS'], **get_throttle_setting('COSTS')}[scope]
+
+
+def _refill(state, rate, burst, now):
+    # state is (tokens, timestamp); a missing bucket starts full
+    if state is None:
+        return burst
+    tokens, updated = state
+    return min(burst, tokens + (now - updated) * rate)
+
+
+def take_tokens(request, scope, cost):
+    """
+    Charge cost tokens to the client's bucket and the global bucket
+    A request is admitted when both buckets hold min(cost, burst) tokens;
+    the full cost is then taken, so a large batch leaves its bucket in debt
+    instead of never fitting. Like DRF's own throttles this is read-modify-
+    write on the cache, so concurrent requests can overshoot slightly.
+    Returns: seconds until the request would be admitted, or None if it was
+    """
+    if not get_throttle_setting('ENABLED'):
+        return None
+    cache = caches[get_throttle_setting('CACHE')]
+    prefix = get_throttle_setting('KEY_PREFIX')
+    now = time.time()
+    buckets = [
+        ('client', f"{prefix}client:{get_client_ip(request)}",
+         get_throttle_setting('CLIENT_RATE'), get_throttle_setting('CLIENT_BURST')),
+        ('global', f"{prefix}global", get_throttle_setting('GLOBAL_RATE'), get_throttle_setting('GLOBAL_BURST')),
+    ]
+
+    states = cache.get_many([key for _, key, _, _ in buckets])
+    levels = []
+    for name, key, rate, burst in buckets:
+        tokens = _refill(states.get(key), rate, burst, now)
+        needed = min(cost, burst)
+        if tokens < needed:
+            throttle_rejected.inc(name)
+            return (needed - tokens) / rate
+        levels.append((key, tokens - cost, rate, burst))
+
+    # Entries expire once the bucket would have refilled completely
+    for key, tokens, rate, burst in levels:
+        cache.set(key, (tokens, now), math.ceil((burst - tokens) / rate) + 1)
+    throttle_admitted.inc(scope)
+    throttle_tokens.inc(scope, cost)
+    return None
+
+
+class GenerationThrottle(BaseThrottle):
+    """
+    Token-bucket admission for the generation views, charged by the view's
+    throttle_scope (see QR_THROTTLE COSTS)
+    """
+
+    def allow_request(self, request, view):
+        scope = view.throttle_scope
+        self.retry_after = take_tokens(request, scope, get_throttle_cost(scope))
+        return self.retry_after is None
+
+    def wait(self):
+        return self.retry_after
@@ -0,0 +1,119 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPLOAD_SETTINGS = {
+    'CHUNK_SIZE': 64 * 1024,  # Bytes buffered per request while streaming
+    'MAX_FILE_SIZE': 10 * 1024 * 1024,
+}
+
+# Leading bytes that identify each accepted upload type
+MAGIC_SIGNATURES = [
+    ('pdf', 0, b'%PDF-'),
+    ('png', 0, b'\x89PNG\r\n\x1a\n'),
+    ('jpeg', 0, b'\xff\xd8\xff'),
+    ('gif', 0, b'GIF87a'),
+    ('gif', 0, b'GIF89a'),
+    ('bmp', 0, b'BM'),
+    ('webp', 8, b'WEBP'),
+]
+SNIFF_BYTES = 16
+IMAGE_TYPES = {'png', 'jpeg', 'gif', 'bmp', 'webp'}
+
+
+def get_upload_setting(name):
+    return {**DEFAULT_UPLOAD_SETTINGS, **getattr(settings, 'QR_UPLOAD', {})}[name]
+
+
+def sniff_file_type(header):
+    """Identify a file from its first bytes, or return None"""
+    for file_type, offset, signature in MAGIC_SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            if file_type == 'webp' and not header.startswith(b'RIFF'):
+                continue
+            return file_type
+    return None
+
+
+def get_file_type(uploaded_file):
+    """Sniffed type of an uploaded file, reading its header if not streamed"""
+    if hasattr(uploaded_file, 'sniffed_type'):
+        return uploaded_file.sniffed_type
+    uploaded_file.seek(0)
+    header = uploaded_file.read(SNIFF_BYTES)
+    uploaded_file.seek(0)
+    return sniff_file_type(header)
+
+
+class StreamedUploadedFile(TemporaryUploadedFile):
+    """Temporary upload carrying metadata gathered while it streamed in"""
+    sha256 = None
+    sniffed_type = None
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Stream each upload to a temporary file in fixed-size chunks, hashing it
+    and checking its magic bytes on the way. Rejected or oversized uploads
+    are drained without being written, and accepted ones keep their
+    temporary path so FileSystemStorage moves rather than copies them.
+    """
+
+    def __init__(self, request=None, allowed_types=None):
+        super().__init__(request)
+        self.chunk_size = get_upload_setting('CHUNK_SIZE')
+        self.max_file_size = get_upload_setting('MAX_FILE_SIZE')
+        self.allowed_types = set(allowed_types) if allowed_types else None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = StreamedUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.digest = hashlib.sha256()
+        self.header = b''
+        self.received = 0
+        self.largest_chunk = 0
+        self.discarding = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        self.largest_chunk = max(self.largest_chunk, len(raw_data))
+        if self.discarding:
+            return None
+
+        if len(self.header) < SNIFF_BYTES:
+            self.header += raw_data[:SNIFF_BYTES - len(self.header)]
+            if len(self.header) >= SNIFF_BYTES:
+                self.file.sniffed_type = sniff_file_type(self.header)
+                if self.allowed_types is not None and self.file.sniffed_type not in self.allowed_types:
+                    self.discarding = True
+                    return None
+
+        if self.received > self.max_file_size:
+            self.discarding = True
+            return None
+
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.file.sniffed_type is None:
+            self.file.sniffed_type = sniff_file_type(self.header)
+        self.file.seek(0)
+        # Size reflects the whole upload so validation can reject it properly
+        self.file.size = self.received
+        if not self.discarding:
+            self.file.sha256 = self.digest.hexdigest()
+        logger.debug(
+            "Streamed upload %s: %d bytes, largest chunk %d bytes",
+            self.file_name, self.received, self.largest_chunk,
+        )
+        return self.file
@@ -1,17 +1,32 @@
 from django.urls import path
 from .views import *
+from .async_views import (
+    text_qr_async_view, url_qr_async_view, pdf_qr_async_view, image_qr_async_view,
+)
 
 urlpatterns = [
     # QR Download
     path('download/<uuid:qr_id>/', download_qr_view, name='download_qr'),
+    path('download/', MultiDownloadView.as_view(), name='download_qr_zip'),
     
     # base URLs
     path('text/', TextQRView.as_view(), name='api_qr_text'),
     path('url/', URLQRView.as_view(), name='api_qr_url'),
     path('pdf/', PDFQRView.as_view(), name='api_qr_pdf'),
     path('image/', ImageQRView.as_view(), name='api_qr_image'),
+    path('batch/', BatchQRView.as_view(), name='api_qr_batch'),
+
+    # Queued generations (?async=true on the endpoints above)
+    path('jobs/<uuid:job_id>/', QRJobView.as_view(), name='api_qr_job'),
+
+    # Async variants for ASGI deployments
+    path('async/text/', text_qr_async_view, name='api_qr_async_text'),
+    path('async/url/', url_qr_async_view, name='api_qr_async_url'),
+    path('async/pdf/', pdf_qr_async_view, name='api_qr_async_pdf'),
+    path('async/image/', image_qr_async_view, name='api_qr_async_image'),
 
     # QR Code Management API
     path('list', QRCodeListView.as_view(), name='api_qr_list'),
     path('detail/<uuid:qr_id>/', QRCodeDetailView.as_view(), name='api_qr_detail'),
+    path('export/', QRExportView.as_view(), name='api_qr_export'),
 ]
\ No newline at end of file
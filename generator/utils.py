@@ -1,14 +1,39 @@
-import qrcode
 from qrcode.image.styledpil import StyledPilImage
 from qrcode.image.styles.moduledrawers import RoundedModuleDrawer
 from io import BytesIO
 import base64
-from PIL import Image
+import hashlib
+import logging
 import os
+from django.conf import settings
 from django.core.files.base import ContentFile
 from .models import QRCode
+from .cache import get_render_cache, render_cache_key
+from .counters import record_download
+from .encoding import encode_qr, qr_from_matrix
+from .metrics import timed
+from .rasterize import render_modules
+from .svg import render_svg
+from .zipstream import stream_zip
 import uuid
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the rendering parameters that are part of every render cache key
+QR_ERROR_CORRECTION = 'L'
+QR_BORDER = 4
+QR_IMAGE_FORMAT = 'png'
+
+# Output formats; the key is also the stored file extension
+QR_IMAGE_FORMATS = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'svg': 'image/svg+xml',
+}
 
 
 def hex_to_rgb(hex_color):
@@ -16,42 +41,186 @@ def hex_to_rgb(hex_color):
     hex_color = hex_color.lstrip('#')
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
-def generate_qr_code(data, size=10, fill_color="#000000", back_color="#FFFFFF"):
+def render_styled(matrix, size, fill_rgb, back_rgb, border=QR_BORDER):
+    """Render through qrcode's StyledPilImage, one PIL draw per module"""
+    qr = qr_from_matrix(matrix, size, border)
+    return qr.make_image(
+        fill_color=fill_rgb,
+        back_color=back_rgb,
+        image_factory=StyledPilImage,
+        module_drawer=RoundedModuleDrawer()
+    )
+
+def render_numpy(matrix, size, fill_rgb, back_rgb, border=QR_BORDER):
+    """Render the module matrix in one vectorized pass"""
+    return render_modules(matrix.modules, size, border, fill_rgb, back_rgb)
+
+# Available renderers, selectable by name
+QR_RENDERERS = {
+    'styled': render_styled,
+    'numpy': render_numpy,
+}
+
+def get_renderer_name(renderer=None):
+    """Resolve a renderer name, falling back to settings.QR_RENDERER"""
+    name = renderer or getattr(settings, 'QR_RENDERER', 'numpy')
+    if name not in QR_RENDERERS:
+        raise ValueError(f"Unknown QR renderer: {name}")
+    return name
+
+def get_render_hash(data, size=10, fill_color="#000000", back_color="#FFFFFF", renderer=None,
+                    error_correction=QR_ERROR_CORRECTION, border=QR_BORDER, image_format=QR_IMAGE_FORMAT):
+    """Content address of the image that generate_qr_code would produce"""
+    return render_cache_key(
+        data, size, fill_color, back_color, error_correction, border,
+        get_renderer_name(renderer), image_format,
+    )
+
+def encode_image(img, image_format):
+    """
+    Encode a rendered image as PNG or lossless WebP
+    PNG compression is set by settings.QR_PNG_COMPRESS_LEVEL (0-9).
+    """
+    img_io = BytesIO()
+    if image_format == 'webp':
+        img.convert('RGB').save(img_io, format='WEBP', lossless=True)
+    else:
+        img.save(img_io, format='PNG', compress_level=getattr(settings, 'QR_PNG_COMPRESS_LEVEL', 6))
+    return img_io.getvalue()
+
+def generate_qr_code(data, size=10, fill_color="#000000", back_color="#FFFFFF",
+                     renderer=None, use_cache=True, error_correction=QR_ERROR_CORRECTION, border=QR_BORDER,
+                     image_format=QR_IMAGE_FORMAT):
     """
     Generate QR code from given data
-    Returns: BytesIO object containing PNG image
+    Identical renders are served from the render cache when use_cache is set.
+    Returns: BytesIO object containing the image in image_format
     """
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=size,
-        border=4,
+    renderer = get_renderer_name(renderer)
+    cache_key = get_render_hash(
+        data, size, fill_color, back_color, renderer, error_correction, border, image_format
     )
-    qr.add_data(data)
-    qr.make(fit=True)
+    if use_cache:
+        cached = get_render_cache().get(cache_key)
+        if cached is not None:
+            return BytesIO(cached)
     
-    # Convert hex colors to RGB
-    fill_rgb = hex_to_rgb(fill_color)
-    back_rgb = hex_to_rgb(back_color)
+    matrix = encode_qr(data, error_correction)
     
-    img = qr.make_image(
-        fill_color=fill_rgb,
-        back_color=back_rgb,
-        image_factory=StyledPilImage,
-        module_drawer=RoundedModuleDrawer()
-    )
+    if image_format == 'svg':
+        with timed('render'):
+            image_bytes = render_svg(matrix.modules.tolist(), size, border, fill_color, back_color)
+    else:
+        # Convert hex colors to RGB
+        fill_rgb = hex_to_rgb(fill_color)
+        back_rgb = hex_to_rgb(back_color)
+        
+        with timed('render'):
+            img = QR_RENDERERS[renderer](matrix, size, fill_rgb, back_rgb, border)
+        
+        with timed('compress'):
+            image_bytes = encode_image(img, image_format)
     
-    # Convert to BytesIO
-    img_io = BytesIO()
-    img.save(img_io, format='PNG', quality=100)
-    img_io.seek(0)
+    if use_cache:
+        get_render_cache().set(cache_key, image_bytes)
     
-    return img_io
+    return BytesIO(image_bytes)
 
-def save_qr_to_model(content_type, original_content, file_obj, size, fill_color, back_color, request):
+def get_qr_data(qr_instance):
     """
-    Generate QR code and save to database
-    Returns: QRCode instance
+    Data encoded in a QRCode instance's image
+    Returns: None for file codes saved before qr_data was recorded, whose
+    encoded data cannot be recovered from the row
+    """
+    if qr_instance.qr_data:
+        return qr_instance.qr_data
+    if qr_instance.content_type in ['text', 'url']:
+        return qr_instance.original_content
+    return None
+
+def get_qr_image_bytes(qr_instance):
+    """
+    Encoded QR image bytes, without decoding or re-encoding
+    Uses the bytes carried over from generation when present, otherwise
+    reads the stored file through the storage API.
+    """
+    if getattr(qr_instance, 'qr_bytes', None):
+        return qr_instance.qr_bytes
+    if not qr_instance.qr_image:
+        return None
+    with qr_instance.qr_image.open('rb') as f:
+        return f.read()
+
+def get_qr_image_in_format(qr_instance, image_format):
+    """
+    QR image bytes in image_format
+    The stored file is used when it already has that format; other formats
+    are rendered from the instance's data and options.
+    """
+    if image_format == qr_instance.image_format:
+        return get_qr_image_bytes(qr_instance)
+    return generate_qr_code(
+        get_qr_data(qr_instance),
+        size=qr_instance.size,
+        fill_color=qr_instance.fill_color,
+        back_color=qr_instance.back_color,
+        error_correction=qr_instance.error_correction,
+        border=qr_instance.border,
+        image_format=image_format,
+    ).getvalue()
+
+def find_stored_file(field_name, **lookup):
+    """Return the stored name of field_name on a matching row, if the file still exists"""
+    name = (
+        QRCode.objects.filter(**lookup)
+        .exclude(**{field_name: ''})
+        .values_list(field_name, flat=True)
+        .first()
+    )
+    if name and QRCode._meta.get_field(field_name).storage.exists(name):
+        return name
+    return None
+
+def find_reusable_qr_image(render_hash):
+    """Return the stored qr_image name of an identical earlier render, if any"""
+    if not getattr(settings, 'QR_REUSE_RENDERED_IMAGES', True):
+        return None
+    return find_stored_file('qr_image', render_hash=render_hash)
+
+def find_reusable_upload(sha256):
+    """Return the stored file name of an identical earlier upload, if any"""
+    if not getattr(settings, 'QR_DEDUPLICATE_UPLOADS', True):
+        return None
+    return find_stored_file('file', file_sha256=sha256)
+
+def hash_uploaded_file(file_obj):
+    """
+    SHA-256 hex digest of an upload
+    Upload handlers that hash while streaming set file_obj.sha256; other
+    files are read once in chunks.
+    """
+    digest = getattr(file_obj, 'sha256', None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    for chunk in file_obj.chunks():
+        sha256.update(chunk)
+    file_obj.seek(0)
+    return sha256.hexdigest()
+
+def delete_stored_files(stored_files):
+    """Best-effort removal of (storage, name) pairs written for a failed save"""
+    for storage, name in stored_files:
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.exception("Could not delete orphaned file %s", name)
+
+def build_qr_instance(content_type, original_content, file_obj, size, fill_color, back_color, request,
+                      error_correction=QR_ERROR_CORRECTION, border=QR_BORDER, image_format=QR_IMAGE_FORMAT):
+    """
+    Prepare an unsaved QRCode instance; no storage or database access
+    The data to encode is stored on qr_data.
     """
     # Prepare data for QR code
     if content_type in ['text', 'url']:
@@ -60,38 +229,102 @@ def save_qr_to_model(content_type, original_content, file_obj, size, fill_color,
         # For files, we'll create a placeholder text with filename
         qr_data = f"File: {file_obj.name}"
     
-    # Generate QR code image
-    img_io = generate_qr_code(
-        qr_data,
-        size=size,
-        fill_color=fill_color,
-        back_color=back_color
-    )
-    
     # Create QRCode instance
     qr_instance = QRCode(
         content_type=content_type,
+        qr_data=qr_data,
         size=size,
         fill_color=fill_color,
         back_color=back_color,
+        error_correction=error_correction,
+        border=border,
+        image_format=image_format,
+        render_hash=get_render_hash(
+            qr_data, size, fill_color, back_color,
+            error_correction=error_correction, border=border, image_format=image_format,
+        ),
     )
     
     # Set content based on type
     if content_type in ['text', 'url']:
         qr_instance.original_content = original_content
-    elif file_obj:
-        qr_instance.file.save(file_obj.name, file_obj)
-    
-    # Save QR image
-    qr_filename = f"qr_{uuid.uuid4().hex}.png"
-    qr_instance.qr_image.save(qr_filename, ContentFile(img_io.getvalue()))
     
     # Optional: Save request metadata
     if request:
         qr_instance.ip_address = get_client_ip(request)
         qr_instance.user_agent = request.META.get('HTTP_USER_AGENT', '')
     
-    qr_instance.save()
+    return qr_instance
+
+def render_qr_image(data, size, fill_color, back_color, error_correction=QR_ERROR_CORRECTION,
+                    border=QR_BORDER, image_format=QR_IMAGE_FORMAT):
+    """Image bytes for data; plain arguments so it can run in a worker pool"""
+    return generate_qr_code(
+        data, size=size, fill_color=fill_color, back_color=back_color,
+        error_correction=error_correction, border=border, image_format=image_format,
+    ).getvalue()
+
+def store_qr_files(qr_instance, file_obj, existing_image=None, image_bytes=None):
+    """
+    Write the upload and QR image for qr_instance without saving the model
+    Uses existing_image (from find_reusable_qr_image) when given, otherwise
+    stores image_bytes. Returns: list of (storage, name) pairs written here
+    """
+    written_files = []
+    try:
+        if file_obj:
+            qr_instance.file_size_bytes = file_obj.size
+            qr_instance.file_sha256 = hash_uploaded_file(file_obj)
+            existing_upload = find_reusable_upload(qr_instance.file_sha256)
+            if existing_upload:
+                qr_instance.file.name = existing_upload
+            else:
+                qr_instance.file.save(file_obj.name, file_obj, save=False)
+                written_files.append((qr_instance.file.storage, qr_instance.file.name))
+        
+        # Save QR image, sharing the stored file of an identical earlier render
+        if existing_image:
+            qr_instance.qr_image.name = existing_image
+            qr_instance.qr_bytes = get_render_cache().get(qr_instance.render_hash)
+        else:
+            qr_instance.qr_bytes = image_bytes
+            qr_filename = f"qr_{uuid.uuid4().hex}.{qr_instance.image_format}"
+            qr_instance.qr_image.save(qr_filename, ContentFile(image_bytes), save=False)
+            written_files.append((qr_instance.qr_image.storage, qr_instance.qr_image.name))
+    except Exception:
+        delete_stored_files(written_files)
+        raise
+    return written_files
+
+def save_qr_to_model(content_type, original_content, file_obj, size, fill_color, back_color, request,
+                     error_correction=QR_ERROR_CORRECTION, border=QR_BORDER, image_format=QR_IMAGE_FORMAT):
+    """
+    Generate QR code and save to database
+    Returns: QRCode instance, with the encoded image carried on qr_bytes
+    """
+    qr_instance = build_qr_instance(
+        content_type, original_content, file_obj, size, fill_color, back_color, request,
+        error_correction, border, image_format,
+    )
+    
+    existing_image = find_reusable_qr_image(qr_instance.render_hash)
+    image_bytes = None
+    if not existing_image:
+        image_bytes = render_qr_image(
+            qr_instance.qr_data, size, fill_color, back_color, error_correction, border, image_format
+        )
+    
+    # Files are written first (save=False, so no model saves), then the row
+    # is inserted with a single INSERT, which is atomic on its own. Files
+    # written here are removed if anything fails; a rollback of an enclosing
+    # transaction is left to the orphan sweep.
+    with timed('storage'):
+        written_files = store_qr_files(qr_instance, file_obj, existing_image, image_bytes)
+    try:
+        qr_instance.save(force_insert=True)
+    except Exception:
+        delete_stored_files(written_files)
+        raise
     
     return qr_instance
 
@@ -104,23 +337,126 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
+def build_qr_payload(qr_instance, embed=True):
+    """
+    JSON body returned by the generation endpoints
+    With embed=False the base64 data URI is replaced by the stored image URL.
+    """
+    payload = {
+        'success': True,
+        'qr_id': str(qr_instance.id),
+    }
+    if embed:
+        qr_base64 = get_qr_as_base64(qr_instance)
+        media_type = QR_IMAGE_FORMATS[qr_instance.image_format]
+        payload['qr_code'] = f"data:{media_type};base64,{qr_base64}" if qr_base64 else None
+    else:
+        payload['image_url'] = qr_instance.qr_image.url if qr_instance.qr_image else None
+    payload.update({
+        'content': qr_instance.get_content_preview(),
+        'download_url': f"/download/{qr_instance.id}/",
+        'created_at': qr_instance.created_at.isoformat(),
+    })
+    return payload
+
 def get_qr_as_base64(qr_instance):
     """Get QR code image as base64 string"""
-    if qr_instance.qr_image:
-        img_io = BytesIO()
-        img = Image.open(qr_instance.qr_image.path)
-        img.save(img_io, format='PNG')
-        img_io.seek(0)
-        return base64.b64encode(img_io.getvalue()).decode('utf-8')
+    image_bytes = get_qr_image_bytes(qr_instance)
+    if image_bytes:
+        return base64.b64encode(image_bytes).decode('utf-8')
     return None
 
-def generate_download_response(qr_instance):
-    """Generate download response for QR code"""
-    if qr_instance.qr_image:
-        qr_instance.increment_download()
-        
-        with open(qr_instance.qr_image.path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='image/png')
-            response['Content-Disposition'] = f'attachment; filename="qr_{qr_instance.id}.png"'
-            return response
-    return None
\ No newline at end of file
+def get_qr_image_etag(qr_instance):
+    """
+    Strong ETag for the stored QR image
+    Stored images never change, so the render hash (or the unique stored
+    name for rows that predate it) identifies the bytes.
+    """
+    tag = qr_instance.render_hash or hashlib.sha256(qr_instance.qr_image.name.encode('utf-8')).hexdigest()
+    return quote_etag(tag)
+
+def set_download_cache_headers(response, etag, last_modified):
+    # Short-lived, so clients come back and revalidate: only 200s count as
+    # downloads, and a cached copy served without asking would never be seen
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = f"public, max-age={getattr(settings, 'QR_DOWNLOAD_MAX_AGE', 300)}, must-revalidate"
+    return response
+
+def is_local_storage(storage):
+    """Whether storage keeps files on the local filesystem (supports .path())"""
+    try:
+        storage.path('')
+    except NotImplementedError:
+        return False
+    return True
+
+def build_file_response(field_file, filename, content_type):
+    """
+    Stream a stored file through the storage API, or hand it to the web
+    server when QR_DOWNLOAD_SENDFILE is 'x-accel-redirect' or 'x-sendfile'
+    (filesystem storage only)
+    """
+    sendfile = getattr(settings, 'QR_DOWNLOAD_SENDFILE', None)
+    if sendfile == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'QR_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + field_file.name
+    elif sendfile == 'x-sendfile' and is_local_storage(field_file.storage):
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.storage.path(field_file.name)
+    else:
+        return FileResponse(
+            field_file.open('rb'),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type,
+        )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def stream_download_zip(qr_instances):
+    """
+    Yield a ZIP of the stored images of qr_instances, in order
+    Each image is read from storage only when its entry is written; images
+    missing from storage are left out.
+    """
+    def entries():
+        for qr_instance in qr_instances:
+            if not qr_instance.qr_image:
+                continue
+            try:
+                image = qr_instance.qr_image.storage.open(qr_instance.qr_image.name, 'rb')
+            except FileNotFoundError:
+                logger.warning("Stored image of QR code %s is missing", qr_instance.id)
+                continue
+            try:
+                yield f"qr_{qr_instance.id}.{qr_instance.image_format}", image
+            finally:
+                image.close()
+    
+    return stream_zip(entries())
+
+def generate_download_response(qr_instance, request=None):
+    """
+    Generate download response for QR code
+    Answers If-None-Match / If-Modified-Since with 304; only responses that
+    send the image count as a download.
+    """
+    if not qr_instance.qr_image:
+        return None
+    
+    etag = get_qr_image_etag(qr_instance)
+    last_modified = int(qr_instance.created_at.timestamp())
+    if request is not None:
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return set_download_cache_headers(not_modified, etag, last_modified)
+    
+    record_download(qr_instance)
+    response = build_file_response(
+        qr_instance.qr_image,
+        f"qr_{qr_instance.id}.{qr_instance.image_format}",
+        QR_IMAGE_FORMATS[qr_instance.image_format],
+    )
+    return set_download_cache_headers(response, etag, last_modified)
@@ -0,0 +1,188 @@
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .counters import record_download
+from .encoding import encode_qr
+from .utils import QR_IMAGE_FORMATS, generate_qr_code, get_qr_data, get_render_hash, set_download_cache_headers
+
+
+DEFAULT_VARIANT_SETTINGS = {
+    'CACHE_DIR': None,  # Defaults to MEDIA_ROOT/variants
+    'MAX_BYTES': 256 * 1024 * 1024,
+    'MIN_PX': 32,
+    'MAX_PX': 4096,
+}
+
+
+def get_variant_setting(name):
+    return {**DEFAULT_VARIANT_SETTINGS, **getattr(settings, 'QR_VARIANTS', {})}[name]
+
+
+class VariantCache:
+    """
+    Directory of rendered variants bounded by total bytes.
+    Files are named by render hash; a hit refreshes the file's mtime, and
+    once the directory grows past max_bytes the least recently used files
+    are removed until it is back under 90% of the budget.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.current_bytes = None  # Measured from disk on first write
+        self._lock = threading.Lock()
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, key[:2], f"{key}.{extension}")
+
+    def get(self, key, extension):
+        """Path of a cached variant, or None"""
+        path = self.path(key, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def set(self, key, extension, data):
+        """Write a variant atomically and evict if over budget. Returns: its path"""
+        path = self.path(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            if self.current_bytes is None:
+                self.current_bytes = sum(size for _, _, size in self._scan())
+            else:
+                self.current_bytes += len(data)
+            if self.current_bytes > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _scan(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, os.path.join(root, name), stat.st_size))
+        return entries
+
+    def _evict(self, keep):
+        # Caller must hold self._lock. Other processes share the directory,
+        # so totals are re-measured from disk rather than trusted. The file
+        # just written (keep) is about to be served and is never evicted.
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for _, path, size in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.current_bytes = total
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_variant_cache():
+    """Process-wide VariantCache configured by settings.QR_VARIANTS"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                directory = get_variant_setting('CACHE_DIR') or os.path.join(settings.MEDIA_ROOT, 'variants')
+                _cache = VariantCache(directory, get_variant_setting('MAX_BYTES'))
+    return _cache
+
+
+def variant_box_size(qr_instance, px):
+    """Largest box size whose image is at most px wide (at least 1)"""
+    if px is None:
+        return qr_instance.size
+    modules_count = encode_qr(get_qr_data(qr_instance), qr_instance.error_correction).modules.shape[0]
+    return max(1, px // (modules_count + 2 * qr_instance.border))
+
+
+def variant_key(qr_instance, box_size, image_format):
+    """Render hash of a variant, which also names its cache file"""
+    return get_render_hash(
+        get_qr_data(qr_instance), box_size, qr_instance.fill_color, qr_instance.back_color,
+        error_correction=qr_instance.error_correction, border=qr_instance.border,
+        image_format=image_format,
+    )
+
+
+def get_variant_path(qr_instance, key, box_size, image_format):
+    """Path of the variant in the cache, rendering it on a miss"""
+    cache = get_variant_cache()
+    path = cache.get(key, image_format)
+    if path is None:
+        # Large variants would churn the in-memory render cache, so bypass it
+        image_bytes = generate_qr_code(
+            get_qr_data(qr_instance),
+            size=box_size,
+            fill_color=qr_instance.fill_color,
+            back_color=qr_instance.back_color,
+            use_cache=False,
+            error_correction=qr_instance.error_correction,
+            border=qr_instance.border,
+            image_format=image_format,
+        ).getvalue()
+        path = cache.set(key, image_format, image_bytes)
+    return path
+
+
+def generate_variant_response(qr_instance, request, px=None, image_format=None):
+    """
+    Download response for a resized or re-formatted copy of the QR code
+    Revalidations are answered with 304 before anything is rendered.
+    """
+    image_format = image_format or qr_instance.image_format
+    box_size = variant_box_size(qr_instance, px)
+    key = variant_key(qr_instance, box_size, image_format)
+
+    etag = quote_etag(key)
+    last_modified = int(qr_instance.created_at.timestamp())
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_download_cache_headers(not_modified, etag, last_modified)
+
+    record_download(qr_instance)
+
+    try:
+        variant_file = open(get_variant_path(qr_instance, key, box_size, image_format), 'rb')
+    except FileNotFoundError:
+        # Evicted by another worker since the lookup; render it again
+        variant_file = open(get_variant_path(qr_instance, key, box_size, image_format), 'rb')
+    response = FileResponse(
+        variant_file,
+        as_attachment=True,
+        filename=f"qr_{qr_instance.id}_{box_size}.{image_format}",
+        content_type=QR_IMAGE_FORMATS[image_format],
+    )
+    return set_download_cache_headers(response, etag, last_modified)
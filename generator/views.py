@@ -1,52 +1,120 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.generics import ListAPIView
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
+from django.conf import settings
+from django.db.models import Q
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 import base64
 from io import BytesIO
 import json
-from django.utils import timezone
-from .models import QRCode
+import uuid
+from .metrics import render_prometheus, timed
+from .counters import record_downloads
+from .export import EXPORT_CONTENT_TYPES, EXPORT_STREAMS, export_queryset
+from .jobs import QueueFull, build_job_payload, enqueue_job, get_job_setting
+from .models import QRCode, QRJob
 from .serializers import *
-from .utils import save_qr_to_model, get_qr_as_base64, generate_download_response
+from .renderers import BinaryImageRenderer, PNGRenderer, SVGRenderer, WebPRenderer
+from .stats import get_qr_stats
+from .throttling import GenerationThrottle, get_throttle_cost, take_tokens
+from .uploads import IMAGE_TYPES, StreamingUploadHandler
+from .utils import (
+    save_qr_to_model, build_qr_payload, generate_download_response,
+    get_qr_data, get_qr_image_in_format, stream_download_zip,
+)
+from .variants import generate_variant_response
+from .batch import (
+    BatchError, get_batch_setting, parse_batch_upload, validate_batch_items,
+    stream_batch_jsonl, stream_batch_zip,
+)
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
 
 class BaseQRView(APIView):
     """Base view for QR generation"""
+    # Accept: image/png, image/webp or image/svg+xml returns the raw image instead of JSON
+    renderer_classes = [JSONRenderer, BrowsableAPIRenderer, PNGRenderer, WebPRenderer, SVGRenderer]
+    # Token buckets per client and overall; subclasses set the cost scope
+    throttle_classes = [GenerationThrottle]
+    throttle_scope = None
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Errors are always reported as JSON, whatever image type was accepted
+        renderer = getattr(request, 'accepted_renderer', None)
+        if isinstance(response, Response) and isinstance(renderer, BinaryImageRenderer) \
+                and not isinstance(response.data, bytes):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+    
+    def create_image_response(self, qr_instance, renderer):
+        """Return the QR image itself, with its id in the X-QR-ID header"""
+        image = get_qr_image_in_format(qr_instance, renderer.format)
+        response = Response(image, content_type=renderer.media_type)
+        response['X-QR-ID'] = str(qr_instance.id)
+        response['Content-Disposition'] = f'inline; filename="qr_{qr_instance.id}.{renderer.format}"'
+        return response
     
     def create_response(self, qr_instance):
         """Create API response from QRCode instance"""
-        qr_base64 = get_qr_as_base64(qr_instance)
-        
-        return Response({
-            'success': True,
-            'qr_id': str(qr_instance.id),
-            'qr_code': f"data:image/png;base64,{qr_base64}" if qr_base64 else None,
-            'content': qr_instance.get_content_preview(),
-            'download_url': f"/download/{qr_instance.id}/",
-            'created_at': qr_instance.created_at.isoformat(),
-        })
+        renderer = self.request.accepted_renderer
+        with timed('response'):
+            if isinstance(renderer, BinaryImageRenderer):
+                return self.create_image_response(qr_instance, renderer)
+            
+            # ?embed=false skips the base64 data URI and links to the stored image instead
+            embed = self.request.query_params.get('embed', 'true').lower() not in ('false', '0', 'no')
+            return Response(build_qr_payload(qr_instance, embed=embed))
+    
+    def wants_job(self):
+        """?async=true queues the generation for run_qr_worker instead of running it here"""
+        return self.request.query_params.get('async', 'false').lower() in ('true', '1', 'yes')
+    
+    def create_job_response(self, generation):
+        """Enqueue save_qr_to_model(**generation) and answer 202 with the job's status URL"""
+        try:
+            job = enqueue_job(request=self.request, **generation)
+        except QueueFull as exc:
+            response = Response({
+                'success': False,
+                'error': str(exc)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(get_job_setting('RETRY_DELAY'))
+            return response
+        payload = build_job_payload(job)
+        return Response(payload, status=status.HTTP_202_ACCEPTED, headers={'Location': payload['status_url']})
 
 @method_decorator(csrf_exempt, name='dispatch')
 class TextQRView(BaseQRView):
+    throttle_scope = 'text'
     serializer_class = TextQRSerializer
     def post(self, request):
         serializer = TextQRSerializer(data=request.data)
         if serializer.is_valid():
-            qr_instance = save_qr_to_model(
+            generation = dict(
                 content_type='text',
                 original_content=serializer.validated_data['text'],
                 file_obj=None,
                 size=serializer.validated_data.get('size', 10),
                 fill_color=serializer.validated_data.get('fill_color', '#000000'),
                 back_color=serializer.validated_data.get('back_color', '#FFFFFF'),
-                request=request
+                error_correction=serializer.validated_data.get('error_correction', 'L'),
+                border=serializer.validated_data.get('border', 4),
+                image_format=serializer.validated_data.get('format', 'png'),
             )
+            if self.wants_job():
+                return self.create_job_response(generation)
+            qr_instance = save_qr_to_model(request=request, **generation)
             return self.create_response(qr_instance)
         
         return Response({
@@ -56,19 +124,25 @@ class TextQRView(BaseQRView):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class URLQRView(BaseQRView):
+    throttle_scope = 'url'
     serializer_class = URLQRSerializer
     def post(self, request):
         serializer = URLQRSerializer(data=request.data)
         if serializer.is_valid():
-            qr_instance = save_qr_to_model(
+            generation = dict(
                 content_type='url',
                 original_content=serializer.validated_data['url'],
                 file_obj=None,
                 size=serializer.validated_data.get('size', 10),
                 fill_color=serializer.validated_data.get('fill_color', '#000000'),
                 back_color=serializer.validated_data.get('back_color', '#FFFFFF'),
-                request=request
+                error_correction=serializer.validated_data.get('error_correction', 'L'),
+                border=serializer.validated_data.get('border', 4),
+                image_format=serializer.validated_data.get('format', 'png'),
             )
+            if self.wants_job():
+                return self.create_job_response(generation)
+            qr_instance = save_qr_to_model(request=request, **generation)
             return self.create_response(qr_instance)
         
         return Response({
@@ -76,23 +150,38 @@ class URLQRView(BaseQRView):
             'errors': serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
 
+class StreamingUploadMixin:
+    """Parse multipart uploads with StreamingUploadHandler"""
+    allowed_upload_types = None
+    
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [StreamingUploadHandler(request, self.allowed_upload_types)]
+        return super().initialize_request(request, *args, **kwargs)
+
 @method_decorator(csrf_exempt, name='dispatch')
-class PDFQRView(BaseQRView):
+class PDFQRView(StreamingUploadMixin, BaseQRView):
+    throttle_scope = 'pdf'
     serializer_class = PDFQRSerializer
     parser_classes = [MultiPartParser, FormParser]
+    allowed_upload_types = {'pdf'}
     
     def post(self, request):
         serializer = PDFQRSerializer(data=request.data)
         if serializer.is_valid():
-            qr_instance = save_qr_to_model(
+            generation = dict(
                 content_type='pdf',
                 original_content='',
                 file_obj=serializer.validated_data['file'],
                 size=serializer.validated_data.get('size', 10),
                 fill_color='#000000',
                 back_color='#FFFFFF',
-                request=request
+                error_correction=serializer.validated_data.get('error_correction', 'L'),
+                border=serializer.validated_data.get('border', 4),
+                image_format=serializer.validated_data.get('format', 'png'),
             )
+            if self.wants_job():
+                return self.create_job_response(generation)
+            qr_instance = save_qr_to_model(request=request, **generation)
             return self.create_response(qr_instance)
         
         return Response({
@@ -101,22 +190,29 @@ class PDFQRView(BaseQRView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 @method_decorator(csrf_exempt, name='dispatch')
-class ImageQRView(BaseQRView):
+class ImageQRView(StreamingUploadMixin, BaseQRView):
+    throttle_scope = 'image'
     parser_classes = [MultiPartParser, FormParser]
     serializer_class = ImageQRSerializer
+    allowed_upload_types = IMAGE_TYPES
     
     def post(self, request):
         serializer = ImageQRSerializer(data=request.data)
         if serializer.is_valid():
-            qr_instance = save_qr_to_model(
+            generation = dict(
                 content_type='image',
                 original_content='',
                 file_obj=serializer.validated_data['file'],
                 size=serializer.validated_data.get('size', 10),
                 fill_color='#000000',
                 back_color='#FFFFFF',
-                request=request
+                error_correction=serializer.validated_data.get('error_correction', 'L'),
+                border=serializer.validated_data.get('border', 4),
+                image_format=serializer.validated_data.get('format', 'png'),
             )
+            if self.wants_job():
+                return self.create_job_response(generation)
+            qr_instance = save_qr_to_model(request=request, **generation)
             return self.create_response(qr_instance)
         
         return Response({
@@ -124,15 +220,226 @@ class ImageQRView(BaseQRView):
             'errors': serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchQRView(APIView):
+    """Generate many text/URL QR codes in one request and stream the results"""
+    serializer_class = BatchQRSerializer
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    
+    def post(self, request):
+        serializer = BatchQRSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        options = serializer.validated_data
+        try:
+            if options.get('file'):
+                items = parse_batch_upload(options['file'], options.get('content_type'))
+            else:
+                items = options['items']
+        except BatchError as exc:
+            return Response({
+                'success': False,
+                'errors': {'file': [str(exc)]}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        max_items = get_batch_setting('MAX_ITEMS', 50000)
+        if len(items) > max_items:
+            return Response({
+                'success': False,
+                'errors': {'items': [f"A batch may contain at most {max_items} items"]}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Charged once the items are counted, before validating and rendering them
+        cost = get_throttle_cost('batch') + len(items) * get_throttle_cost('batch_item')
+        retry_after = take_tokens(request, 'batch', cost)
+        if retry_after is not None:
+            self.throttled(request, retry_after)
+        
+        validated, errors = validate_batch_items(items)
+        if errors:
+            return Response({
+                'success': False,
+                'errors': errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if options['output'] == 'jsonl':
+            return StreamingHttpResponse(
+                stream_batch_jsonl(validated, request),
+                content_type='application/x-ndjson'
+            )
+        
+        response = StreamingHttpResponse(
+            stream_batch_zip(validated, request),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = 'attachment; filename="qr_batch.zip"'
+        return response
+
+@method_decorator(csrf_exempt, name='dispatch')
+class MultiDownloadView(APIView):
+    """Download many stored QR codes as one streamed ZIP"""
+    serializer_class = QRMultiDownloadSerializer
+    
+    def post(self, request):
+        serializer = QRMultiDownloadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        ids = serializer.validated_data['ids']
+        qr_codes = {
+            qr_instance.id: qr_instance
+            for qr_instance in QRCode.objects.filter(pk__in=ids).only('id', 'qr_image', 'image_format')
+        }
+        missing = [str(qr_id) for qr_id in ids if qr_id not in qr_codes]
+        if missing:
+            return Response({
+                'success': False,
+                'errors': {'ids': [f"Unknown QR code ids: {', '.join(missing)}"]}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        record_downloads(list(qr_codes))
+        response = StreamingHttpResponse(
+            stream_download_zip([qr_codes[qr_id] for qr_id in ids]),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = 'attachment; filename="qr_codes.zip"'
+        return response
+
+class QRCodeCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id), newest first
+    DRF's CursorPagination filters on the first ordering field only and
+    skips through equal timestamps with an OFFSET; here the cursor holds
+    both fields, so rows inserted together page without one.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor.position if self.cursor else None
+        
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            created_at, pk = self.parse_position(position)
+            if reverse:
+                queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+            else:
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        
+        # One extra row tells whether another page follows
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > self.page_size:
+            following = self._get_position_from_instance(results[-1], self.ordering)
+        
+        # The attributes DRF's get_next_link/get_previous_link read
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = position is not None, position
+            self.has_previous, self.previous_position = following is not None, following
+        else:
+            self.has_next, self.next_position = following is not None, following
+            self.has_previous, self.previous_position = position is not None, position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+    
+    def _get_position_from_instance(self, instance, ordering):
+        return f"{instance.created_at.isoformat()}|{instance.pk}"
+    
+    def parse_position(self, position):
+        created_at, _, pk = position.partition('|')
+        try:
+            created_at, pk = parse_datetime(created_at), uuid.UUID(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
 class QRCodeListView(ListAPIView):
     """List all QR codes (for admin/stats)"""
     queryset = QRCode.objects.all().order_by('-created_at')
     serializer_class = QRCodeSerializer
-    pagination_class = None  # Or use PageNumberPagination
+    pagination_class = QRCodeCursorPagination
+    
+    # Only the columns QRCodeSerializer reads
+    list_fields = (
+        'id', 'content_type', 'original_content', 'file', 'file_size_bytes', 'size',
+        'fill_color', 'back_color', 'error_correction', 'border', 'image_format', 'created_at',
+        'download_count', 'qr_image',
+    )
     
     def get_queryset(self):
-        # Optional: Limit to last 100 entries
-        return QRCode.objects.all().order_by('-created_at')[:100]
+        filters = QRCodeListFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+        
+        queryset = QRCode.objects.only(*self.list_fields)
+        if 'content_type' in params:
+            queryset = queryset.filter(content_type=params['content_type'])
+        if 'created_after' in params:
+            queryset = queryset.filter(created_at__gte=params['created_after'])
+        if 'created_before' in params:
+            queryset = queryset.filter(created_at__lt=params['created_before'])
+        return queryset
+
+class QRJobView(APIView):
+    """Status of a queued generation, with the QR code once it has succeeded"""
+    
+    def get(self, request, job_id):
+        try:
+            job = QRJob.objects.select_related('result').get(id=job_id)
+        except QRJob.DoesNotExist:
+            return Response({
+                'success': False,
+                'error': 'Job not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response(build_job_payload(job))
+
+class QRExportView(APIView):
+    """Stream every QR code as JSONL, CSV or a ZIP with the images (staff only)"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        serializer = QRExportSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        params = serializer.validated_data
+        queryset = export_queryset(
+            params.get('content_type'), params.get('created_after'), params.get('created_before')
+        )
+        output = params['output']
+        response = StreamingHttpResponse(
+            EXPORT_STREAMS[output](queryset),
+            content_type=EXPORT_CONTENT_TYPES[output]
+        )
+        response['Content-Disposition'] = f'attachment; filename="qr_codes.{output}"'
+        return response
 
 class QRCodeDetailView(APIView):
     """Get details of a specific QR code"""
@@ -155,14 +462,8 @@ def home_view(request):
     recent_qrs = QRCode.objects.all().order_by('-created_at')[:5]
     
     # Get statistics
-    total_qrs = QRCode.objects.count()
-    stats = {
-        'total': total_qrs,
-        'text': QRCode.objects.filter(content_type='text').count(),
-        'url': QRCode.objects.filter(content_type='url').count(),
-        'pdf': QRCode.objects.filter(content_type='pdf').count(),
-        'image': QRCode.objects.filter(content_type='image').count(),
-    }
+    snapshot = get_qr_stats()
+    stats = {'total': snapshot['total_qrs'], **snapshot['by_type']}
     
     return render(request, 'home.html', {
         'recent_qrs': recent_qrs,
@@ -170,15 +471,51 @@ def home_view(request):
     })
 
 def download_qr_view(request, qr_id):
-    """Download QR code as PNG file"""
+    """
+    Download the stored QR code image
+    ?px=<width> and/or ?format=png|webp|svg return a variant rendered from
+    the stored data and kept in the on-disk variant cache.
+    """
+    variant = QRVariantSerializer(data=request.GET)
+    if not variant.is_valid():
+        return JsonResponse({
+            'success': False,
+            'errors': variant.errors
+        }, status=400)
+    
     qr_instance = get_object_or_404(QRCode, id=qr_id)
     
-    response = generate_download_response(qr_instance)
+    px = variant.validated_data.get('px')
+    image_format = variant.validated_data.get('format')
+    if px is not None or (image_format and image_format != qr_instance.image_format):
+        # Rendering anything else would produce a different code
+        if get_qr_data(qr_instance) is None:
+            return JsonResponse({
+                'success': False,
+                'error': 'Only the stored image is available for this QR code'
+            }, status=409)
+        return generate_variant_response(qr_instance, request, px, image_format)
+    
+    response = generate_download_response(qr_instance, request)
     if response:
         return response
     
     return JsonResponse({'error': 'QR code not found'}, status=404)
 
+def metrics_view(request):
+    """
+    Prometheus text exposition of this process's metrics
+    Open to staff users, and to scrapers sending settings.QR_METRICS_TOKEN as a
+    Bearer token. Without a token configured it is hidden from everyone else.
+    """
+    token = getattr(settings, 'QR_METRICS_TOKEN', None)
+    if not request.user.is_staff:
+        if not token:
+            return HttpResponse(status=404)
+        if not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return HttpResponse(status=401)
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def qr_history_view(request):
     """View QR code history"""
     qr_codes = QRCode.objects.all().order_by('-created_at')[:50]
@@ -190,21 +527,5 @@ def api_docs_view(request):
 
 def stats_view(request):
     """View statistics page"""
-    stats = {
-        'total_qrs': QRCode.objects.count(),
-        'total_downloads': sum(qr.download_count for qr in QRCode.objects.all()),
-        'by_type': {
-            'text': QRCode.objects.filter(content_type='text').count(),
-            'url': QRCode.objects.filter(content_type='url').count(),
-            'pdf': QRCode.objects.filter(content_type='pdf').count(),
-            'image': QRCode.objects.filter(content_type='image').count(),
-        },
-        'today_count': QRCode.objects.filter(
-            created_at__date=timezone.now().date()
-        ).count(),
-        'most_downloaded': QRCode.objects.order_by('-download_count').first(),
-        'recent_activity': QRCode.objects.order_by('-last_downloaded').filter(
-            last_downloaded__isnull=False
-        )[:10],
-    }
+    stats = get_qr_stats()
     return render(request, 'stats.html', {'stats': stats})
\ No newline at end of file
@@ -0,0 +1,62 @@
+import zipfile
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are drained by a generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_STORED, chunk_size=64 * 1024):
+    """
+    Yield a ZIP archive piece by piece from (name, data) pairs.
+    data may be bytes or a readable file object; only the central directory
+    is held in memory, so archives of any size stream with flat memory.
+    PNGs are already deflated, hence ZIP_STORED by default.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=compression, allowZip64=True) as archive:
+        for name, data in entries:
+            if hasattr(data, 'read'):
+                with archive.open(name, mode='w', force_zip64=True) as dest:
+                    for block in iter(lambda: data.read(chunk_size), b''):
+                        dest.write(block)
+                        yield buffer.drain()
+            else:
+                archive.writestr(name, data)
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    yield buffer.drain()
+
+
+class IterableReader:
+    """Readable file object over an iterable of bytes, for streaming a generated entry"""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self._pending = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            try:
+                self._pending += next(self._iterator)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
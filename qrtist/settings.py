@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'generator.middleware.ServerTimingMiddleware',  # First, so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add this after security middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -140,13 +141,37 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # Railway will collect static files here
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
-# Whitenoise configuration
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-
 # Media files - For Railway, use cloud storage or Railway's volume
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Storage for QR images and uploads. QR_MEDIA_STORAGE=s3 keeps them in an
+# S3-compatible bucket (optional dependency: pip install "django-storages[s3]");
+# point AWS_S3_ENDPOINT_URL at MinIO to run against a local stand-in.
+if os.environ.get('QR_MEDIA_STORAGE') == 's3':
+    MEDIA_STORAGE = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.environ.get('AWS_STORAGE_BUCKET_NAME', 'qrtist'),
+            'endpoint_url': os.environ.get('AWS_S3_ENDPOINT_URL') or None,
+            'access_key': os.environ.get('AWS_ACCESS_KEY_ID'),
+            'secret_key': os.environ.get('AWS_SECRET_ACCESS_KEY'),
+            'region_name': os.environ.get('AWS_S3_REGION_NAME') or None,
+            'custom_domain': os.environ.get('AWS_S3_CUSTOM_DOMAIN') or None,
+            'querystring_auth': os.environ.get('AWS_QUERYSTRING_AUTH', 'False') == 'True',
+            'default_acl': None,
+            'file_overwrite': False,  # Shared blobs must never be replaced in place
+        },
+    }
+else:
+    MEDIA_STORAGE = {'BACKEND': 'django.core.files.storage.FileSystemStorage'}
+
+STORAGES = {
+    'default': MEDIA_STORAGE,
+    # Whitenoise configuration
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+
 # Create these directories if they don't exist
 os.makedirs(STATIC_ROOT, exist_ok=True)
 os.makedirs(MEDIA_ROOT, exist_ok=True)
@@ -181,6 +206,109 @@ SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
 
+# QR rendering settings
+QR_RENDERER = os.environ.get('QR_RENDERER', 'numpy')  # 'numpy' or 'styled'
+QR_ENCODER = os.environ.get('QR_ENCODER', 'numpy')  # 'numpy' or 'qrcode'; both give identical matrices
+QR_PNG_COMPRESS_LEVEL = int(os.environ.get('QR_PNG_COMPRESS_LEVEL', 6))  # zlib level 0-9
+QR_RENDER_CACHE = {
+    'MAX_BYTES': int(os.environ.get('QR_RENDER_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    'SHARED_CACHE': os.environ.get('QR_RENDER_CACHE_SHARED') or None,  # e.g. 'default'
+    'SHARED_TIMEOUT': 60 * 60 * 24,
+}
+QR_MATRIX_CACHE = {
+    'MAX_BYTES': 8 * 1024 * 1024,  # Encoded module matrices, reused across sizes/colors
+}
+QR_REUSE_RENDERED_IMAGES = True  # Point identical renders at one stored PNG
+QR_DEDUPLICATE_UPLOADS = True  # Point identical PDF/image uploads at one stored blob
+
+# Download counting: BUFFERED accumulates counts in the cache until
+# `manage.py flush_download_counts` runs (needs a cache shared by all workers)
+QR_DOWNLOAD_COUNTS = {
+    'BUFFERED': os.environ.get('QR_BUFFER_DOWNLOAD_COUNTS', 'False') == 'True',
+    'CACHE': 'default',
+}
+
+# Downloads: None streams from storage; 'x-sendfile' (Apache) or
+# 'x-accel-redirect' (nginx, internal location QR_DOWNLOAD_ACCEL_PREFIX -> MEDIA_ROOT)
+QR_DOWNLOAD_SENDFILE = os.environ.get('QR_DOWNLOAD_SENDFILE') or None
+QR_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+QR_DOWNLOAD_MAX_AGE = 300  # Seconds; clients then revalidate, and only 200s count as downloads
+
+# Resized/re-formatted downloads (?px=, ?format=) are cached on local disk
+QR_VARIANTS = {
+    'CACHE_DIR': os.environ.get('QR_VARIANT_CACHE_DIR') or BASE_DIR / 'cache' / 'qr_variants',
+    'MAX_BYTES': int(os.environ.get('QR_VARIANT_CACHE_MAX_BYTES', 256 * 1024 * 1024)),  # LRU by mtime
+    'MIN_PX': 32,
+    'MAX_PX': 4096,
+}
+
+# Per-stage timings: Server-Timing response header and Prometheus text at
+# /metrics (per process). Both expose internals, so by default only staff
+# users see them. QR_SERVER_TIMING is 'staff', 'all' or 'off'; a
+# QR_METRICS_TOKEN also lets scrapers in with a Bearer token.
+QR_SERVER_TIMING = os.environ.get('QR_SERVER_TIMING', 'staff')
+QR_METRICS_TOKEN = os.environ.get('QR_METRICS_TOKEN') or None
+
+# Stats and home pages reuse one aggregate snapshot for this many seconds
+QR_STATS_CACHE_TTL = 30
+
+# PDF/image uploads stream to a temporary file in CHUNK_SIZE pieces, so
+# CHUNK_SIZE bounds the upload buffer held in memory per request
+QR_UPLOAD = {
+    'CHUNK_SIZE': 64 * 1024,
+    'MAX_FILE_SIZE': 10 * 1024 * 1024,
+}
+
+# Async generation endpoints (/api/qr/async/...) under an ASGI server
+QR_ASYNC = {
+    'EXECUTOR': os.environ.get('QR_ASYNC_EXECUTOR', 'thread'),  # 'thread' or 'process'
+    'WORKERS': int(os.environ.get('QR_ASYNC_WORKERS', 4)),
+    'MAX_PENDING': int(os.environ.get('QR_ASYNC_MAX_PENDING', 32)),  # Beyond this: 429
+    'RETRY_AFTER': 1,
+}
+
+# Batch generation (/api/qr/batch/)
+QR_BATCH = {
+    'WORKERS': int(os.environ.get('QR_BATCH_WORKERS', os.cpu_count() or 1)),  # 1 renders inline
+    'CHUNK_SIZE': 500,  # Rows per bulk_create
+    'MAX_ITEMS': 50000,
+    'MAX_DOWNLOAD_IDS': 5000,  # Ids per multi-download ZIP (/api/qr/download/)
+}
+
+# Token-bucket admission for the generation endpoints: one bucket per client
+# IP plus one global bucket, answering 429 + Retry-After when either is empty.
+# Buckets live in the default cache, so they are per process unless CACHES
+# points at a shared backend (Redis, Memcached).
+QR_THROTTLE = {
+    'ENABLED': os.environ.get('QR_THROTTLE_ENABLED', 'True') == 'True',
+    'CLIENT_RATE': float(os.environ.get('QR_THROTTLE_CLIENT_RATE', 2.0)),  # Tokens per second
+    'CLIENT_BURST': int(os.environ.get('QR_THROTTLE_CLIENT_BURST', 30)),
+    'GLOBAL_RATE': float(os.environ.get('QR_THROTTLE_GLOBAL_RATE', 50.0)),
+    'GLOBAL_BURST': int(os.environ.get('QR_THROTTLE_GLOBAL_BURST', 300)),
+    # Tokens per request; uploads cost more, batches add batch_item per item
+    'COSTS': {'text': 1, 'url': 1, 'pdf': 5, 'image': 5, 'batch': 1, 'batch_item': 0.2},
+}
+
+# Queued generation: ?async=true on the generation endpoints answers 202
+# and `manage.py run_qr_worker` completes the job from the database queue
+QR_JOBS = {
+    'WORKERS': int(os.environ.get('QR_JOB_WORKERS', 2)),  # Processes per run_qr_worker
+    'MAX_ATTEMPTS': 3,
+    'VISIBILITY_TIMEOUT': 300,  # Must exceed the slowest job, or it runs twice
+    'RETRY_DELAY': 5,  # Doubled after each failed attempt
+    'MAX_QUEUED': int(os.environ.get('QR_JOB_MAX_QUEUED', 10000)),  # Beyond this: 503
+}
+
+# `manage.py purge_qr_codes` deletes codes older than DAYS (unless downloaded
+# in the last KEEP_DOWNLOADED_DAYS) and media files no row references
+QR_RETENTION = {
+    'DAYS': int(os.environ.get('QR_RETENTION_DAYS', 365)),
+    'KEEP_DOWNLOADED_DAYS': 30,
+    'ORPHAN_GRACE_HOURS': 24,  # Younger files may belong to a save in progress
+    'REUSE_GRACE_SECONDS': 60,  # Wait before deleting the files of deleted rows
+    'BATCH_SIZE': 1000,
+}
+
 # Jazzmin settings
 JAZZMIN_SETTINGS = {
     "site_title": "QRtist Admin",
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.urls import include, path
 from django.views.static import serve
-from generator.views import api_docs_view, home_view, qr_history_view, stats_view
+from generator.views import api_docs_view, home_view, metrics_view, qr_history_view, stats_view
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -14,6 +14,7 @@ urlpatterns = [
     path('history/', qr_history_view, name='history'),
     path('stats/', stats_view, name='stats'),
     path('docs/', api_docs_view, name='api_docs'),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
 